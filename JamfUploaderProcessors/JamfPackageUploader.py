@@ -249,6 +249,19 @@ class JamfPackageUploader(JamfPackageUploaderBase):
         "pkg_uploaded": {
             "description": "True/False depending if a package was uploaded or not.",
         },
+        "jamfpackageuploader_batch_results": {
+            "description": (
+                "When pkg_batch is used, a list with the result of each package upload."
+            ),
+        },
+        "jamfpackageuploader_transfers": {
+            "description": (
+                "A list with a record of each transfer of the package (to the Cloud "
+                "DP, S3 bucket or each File Share DP), giving the size, bytes "
+                "transferred and resumed, time taken, rate in MB/s and number of "
+                "retries."
+            ),
+        },
         "jamfpackageuploader_summary_result": {
             "description": "Description of interesting results.",
         },
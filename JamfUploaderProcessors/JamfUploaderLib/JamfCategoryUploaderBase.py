@@ -20,8 +20,6 @@ limitations under the License.
 import os.path
 import sys
 
-from time import sleep
-
 from autopkglib import (  # pylint: disable=import-error
     ProcessorError,
 )
@@ -57,28 +55,17 @@ class JamfCategoryUploaderBase(JamfUploaderBase):
             url = f"{jamf_url}/{self.api_endpoints(object_type)}"
 
         # write the category.
-        count = 0
         category_json = self.write_json_file(category_data)
-        while True:
-            count += 1
-            self.output(
-                f"Category upload attempt {count}",
-                verbose_level=2,
-            )
-            request = "PUT" if obj_id else "POST"
-            r = self.curl(request=request, url=url, token=token, data=category_json)
-
-            # check HTTP response
-            if self.status_check(r, "Category", category_name, request) == "break":
-                break
-            if count > 5:
-                self.output("ERROR: Category creation did not succeed after 5 attempts")
-                self.output(f"\nHTTP POST Response Code: {r.status_code}")
-                raise ProcessorError("ERROR: Category upload failed ")
-            if int(sleep_time) > 30:
-                sleep(int(sleep_time))
-            else:
-                sleep(30)
+        request = "PUT" if obj_id else "POST"
+        self.curl_with_retry(
+            "Category",
+            category_name,
+            sleep_time,
+            request=request,
+            url=url,
+            token=token,
+            data=category_json,
+        )
 
     def execute(self):
         """Upload a category"""
@@ -20,8 +20,6 @@ limitations under the License.
 import os.path
 import sys
 
-from time import sleep
-
 from autopkglib import (  # pylint: disable=import-error
     ProcessorError,
 )
@@ -51,23 +49,14 @@ class JamfComputerGroupDeleterBase(JamfUploaderBase):
         object_type = "computer_group"
         url = f"{jamf_url}/{self.api_endpoints(object_type)}/id/{obj_id}"
 
-        count = 0
-        while True:
-            count += 1
-            self.output(f"Computer Group delete attempt {count}", verbose_level=2)
-            request = "DELETE"
-            r = self.curl(request=request, url=url, token=token)
-
-            # check HTTP response
-            if self.status_check(r, "Computer Group", obj_id, request) == "break":
-                break
-            if count > 5:
-                self.output(
-                    "WARNING: Computer Group deletion did not succeed after 5 attempts"
-                )
-                self.output(f"\nHTTP POST Response Code: {r.status_code}")
-                raise ProcessorError("ERROR: Computer Group deletion failed ")
-            sleep(30)
+        request = "DELETE"
+        r = self.curl_with_retry(
+            "Computer Group",
+            obj_id,
+            request=request,
+            url=url,
+            token=token,
+        )
         return r
 
     def execute(self):
@@ -90,34 +90,16 @@ class JamfComputerGroupUploaderBase(JamfUploaderBase):
         object_type = "computer_group"
         url = f"{jamf_url}/{self.api_endpoints(object_type)}/id/{obj_id}"
 
-        count = 0
-        while True:
-            count += 1
-            self.output(f"Computer Group upload attempt {count}", verbose_level=2)
-            request = "PUT" if obj_id else "POST"
-            r = self.curl(
-                request=request,
-                url=url,
-                token=token,
-                data=template_xml,
-            )
-
-            # check HTTP response
-            if (
-                self.status_check(r, "Computer Group", computergroup_name, request)
-                == "break"
-            ):
-                break
-            if count > 5:
-                self.output(
-                    "WARNING: Computer Group upload did not succeed after 5 attempts"
-                )
-                self.output(f"\nHTTP POST Response Code: {r.status_code}")
-                raise ProcessorError("ERROR: Computer Group upload failed ")
-            if int(sleep_time) > 30:
-                sleep(int(sleep_time))
-            else:
-                sleep(30)
+        request = "PUT" if obj_id else "POST"
+        self.curl_with_retry(
+            "Computer Group",
+            computergroup_name,
+            sleep_time,
+            request=request,
+            url=url,
+            token=token,
+            data=template_xml,
+        )
 
     def execute(self):
         """Upload a computer group"""
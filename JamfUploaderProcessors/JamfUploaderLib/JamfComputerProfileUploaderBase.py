@@ -22,8 +22,6 @@ import sys
 import plistlib
 import uuid
 
-from time import sleep
-
 from autopkglib import (  # pylint: disable=import-error
     ProcessorError,
 )
@@ -250,38 +248,16 @@ class JamfComputerProfileUploaderBase(JamfUploaderBase):
         # if we find an object ID we put, if not, we post
         url = f"{jamf_url}/{self.api_endpoints(object_type)}/id/{obj_id}"
 
-        count = 0
-        while True:
-            count += 1
-            self.output(
-                f"Configuration Profile upload attempt {count}", verbose_level=1
-            )
-            request = "PUT" if obj_id else "POST"
-            r = self.curl(
-                request=request,
-                url=url,
-                token=token,
-                data=template_xml,
-            )
-
-            # check HTTP response
-            if (
-                self.status_check(
-                    r, "Configuration Profile", mobileconfig_name, request
-                )
-                == "break"
-            ):
-                break
-            if count > 5:
-                self.output(
-                    "ERROR: Configuration Profile upload did not succeed after 5 attempts"
-                )
-                self.output(f"\nHTTP POST Response Code: {r.status_code}")
-                break
-            if int(sleep_time) > 30:
-                sleep(int(sleep_time))
-            else:
-                sleep(30)
+        request = "PUT" if obj_id else "POST"
+        r = self.curl_with_retry(
+            "Configuration Profile",
+            mobileconfig_name,
+            sleep_time,
+            request=request,
+            url=url,
+            token=token,
+            data=template_xml,
+        )
 
         return r
 
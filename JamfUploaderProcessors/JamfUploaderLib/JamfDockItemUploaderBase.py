@@ -24,8 +24,6 @@ import os.path
 import sys
 import xml.etree.ElementTree as ET
 
-from time import sleep
-
 from autopkglib import (  # pylint: disable=import-error
     ProcessorError,
 )
@@ -70,33 +68,16 @@ class JamfDockItemUploaderBase(JamfUploaderBase):
         object_type = "dock_item"
         url = f"{jamf_url}/{self.api_endpoints(object_type)}/id/{obj_id}"
 
-        count = 0
-        while True:
-            count += 1
-            self.output(
-                f"Dock Item upload attempt {count}",
-                verbose_level=2,
-            )
-            request = "PUT" if obj_id else "POST"
-            r = self.curl(
-                request=request,
-                url=url,
-                token=token,
-                data=dock_item_xml,
-            )
-            # check HTTP response
-            if self.status_check(r, "Dock Item", dock_item_name, request) == "break":
-                break
-            if count > 5:
-                self.output(
-                    "ERROR: Temporary dock item update did not succeed after 5 attempts"
-                )
-                self.output(f"\nHTTP POST Response Code: {r.status_code}")
-                raise ProcessorError("ERROR: dock item upload failed ")
-            if int(sleep_time) > 30:
-                sleep(int(sleep_time))
-            else:
-                sleep(30)
+        request = "PUT" if obj_id else "POST"
+        self.curl_with_retry(
+            "Dock Item",
+            dock_item_name,
+            sleep_time,
+            request=request,
+            url=url,
+            token=token,
+            data=dock_item_xml,
+        )
 
     def execute(self):
         """Upload a dock item"""
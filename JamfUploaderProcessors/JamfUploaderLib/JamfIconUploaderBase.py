@@ -20,8 +20,6 @@ limitations under the License.
 import os.path
 import sys
 
-from time import sleep
-
 from autopkglib import (  # pylint: disable=import-error
     ProcessorError,
 )
@@ -44,26 +42,15 @@ class JamfIconUploaderBase(JamfUploaderBase):
 
         self.output(f"Downloading icon from {icon_uri}...", verbose_level=2)
         # download the icon
-        count = 0
-        while True:
-            count += 1
-            self.output(
-                f"Icon download attempt {count}",
-                verbose_level=2,
-            )
-            request = "GET"
-            r = self.curl(request=request, url=icon_uri, endpoint_type="icon_get")
-            # check HTTP response
-            if self.status_check(r, "Icon", icon_uri, request) == "break":
-                break
-            if count > 5:
-                self.output("ERROR: Icon download did not succeed after 5 attempts")
-                self.output(f"\nHTTP POST Response Code: {r.status_code}")
-                raise ProcessorError("ERROR: Icon download failed ")
-            if int(sleep_time) > 30:
-                sleep(int(sleep_time))
-            else:
-                sleep(30)
+        request = "GET"
+        r = self.curl_with_retry(
+            "Icon",
+            icon_uri,
+            sleep_time,
+            request=request,
+            url=icon_uri,
+            endpoint_type="icon_get",
+        )
         return r
 
     def upload_icon(self, jamf_url, icon_file, sleep_time, token):
@@ -76,33 +63,17 @@ class JamfIconUploaderBase(JamfUploaderBase):
         url = f"{jamf_url}/{self.api_endpoints(object_type)}"
 
         # upload the icon
-        count = 0
-        while True:
-            count += 1
-            self.output(
-                f"Icon upload attempt {count}",
-                verbose_level=2,
-            )
-            request = "POST"
-            r = self.curl(
-                request=request,
-                url=url,
-                token=token,
-                data=icon_file,
-                endpoint_type="icon_upload",
-            )
-
-            # check HTTP response
-            if self.status_check(r, "Icon", icon_file, request) == "break":
-                break
-            if count > 5:
-                self.output("ERROR: Icon upload did not succeed after 5 attempts")
-                self.output(f"\nHTTP POST Response Code: {r.status_code}")
-                raise ProcessorError("ERROR: Icon upload failed ")
-            if int(sleep_time) > 30:
-                sleep(int(sleep_time))
-            else:
-                sleep(30)
+        request = "POST"
+        r = self.curl_with_retry(
+            "Icon",
+            icon_file,
+            sleep_time,
+            request=request,
+            url=url,
+            token=token,
+            data=icon_file,
+            endpoint_type="icon_upload",
+        )
         return r
 
     def execute(self):
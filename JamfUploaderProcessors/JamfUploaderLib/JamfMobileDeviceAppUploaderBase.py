@@ -20,8 +20,6 @@ limitations under the License.
 import os.path
 import sys
 
-from time import sleep
-
 from autopkglib import (  # pylint: disable=import-error
     ProcessorError,
 )
@@ -117,35 +115,16 @@ class JamfMobileDeviceAppUploaderBase(JamfUploaderBase):
         object_type = "mobile_device_application"
         url = f"{jamf_url}/{self.api_endpoints(object_type)}/id/{obj_id}"
 
-        count = 0
-        while True:
-            count += 1
-            self.output(f"Mobile device app upload attempt {count}", verbose_level=2)
-            request = "PUT" if obj_id else "POST"
-            r = self.curl(
-                request=request,
-                url=url,
-                token=token,
-                data=template_xml,
-            )
-            # check HTTP response
-            if (
-                self.status_check(
-                    r, "mobile_device_application", mobiledeviceapp_name, request
-                )
-                == "break"
-            ):
-                break
-            if count > 5:
-                self.output(
-                    "WARNING: Mobile device app upload did not succeed after 5 attempts"
-                )
-                self.output(f"\nHTTP POST Response Code: {r.status_code}")
-                raise ProcessorError("ERROR: Mobile device app upload failed ")
-            if int(sleep_time) > 30:
-                sleep(int(sleep_time))
-            else:
-                sleep(30)
+        request = "PUT" if obj_id else "POST"
+        r = self.curl_with_retry(
+            "mobile_device_application",
+            mobiledeviceapp_name,
+            sleep_time,
+            request=request,
+            url=url,
+            token=token,
+            data=template_xml,
+        )
         return r
 
     def execute(self):
@@ -21,7 +21,6 @@ import json
 import os.path
 import sys
 
-from time import sleep
 from urllib.parse import urlparse
 
 from autopkglib import (  # pylint: disable=import-error
@@ -73,23 +72,14 @@ class JamfPackageCleanerBase(JamfUploaderBase):
         object_type = "package"
         url = f"{jamf_url}/{self.api_endpoints(object_type)}/id/{obj_id}"
 
-        count = 0
-        while True:
-            count += 1
-            self.output(f"Package delete attempt {count}", verbose_level=2)
-            request = "DELETE"
-            r = self.curl(request=request, url=url, token=token)
-
-            # check HTTP response
-            if self.status_check(r, "Package", obj_id, request) == "break":
-                break
-            if count > 5:
-                self.output(
-                    "WARNING: Package deletion did not succeed after 5 attempts"
-                )
-                self.output(f"\nHTTP DELETE Response Code: {r.status_code}")
-                raise ProcessorError("ERROR: Package deletion failed")
-            sleep(30)
+        request = "DELETE"
+        r = self.curl_with_retry(
+            "Package",
+            obj_id,
+            request=request,
+            url=url,
+            token=token,
+        )
         return r
 
     def execute(self):
@@ -70,6 +70,7 @@ class JamfPackageRecalculatorBase(JamfUploaderBase):
 
         jcds2_mode = self.env.get("jcds2_mode")
         pkg_api_mode = self.env.get("pkg_api_mode")
+        defer_recalculation = self.env.get("defer_recalculation")
         jamf_url = self.env.get("JSS_URL").rstrip("/")
         jamf_user = self.env.get("API_USERNAME")
         jamf_password = self.env.get("API_PASSWORD")
@@ -81,6 +82,8 @@ class JamfPackageRecalculatorBase(JamfUploaderBase):
             pkg_api_mode = False
         if not jcds2_mode or jcds2_mode == "False":
             jcds2_mode = False
+        if not defer_recalculation or defer_recalculation == "False":
+            defer_recalculation = False
 
         # set pkg_api_mode if appropriate
 
@@ -105,7 +108,15 @@ class JamfPackageRecalculatorBase(JamfUploaderBase):
 
         # recalculate packages on JCDS if the metadata was updated and recalculation requested
         # (only works on Jamf Pro 11.10 or newer)
-        if (pkg_api_mode or jcds2_mode) and APLooseVersion(
+        if (
+            (pkg_api_mode or jcds2_mode)
+            and APLooseVersion(jamf_pro_version) >= APLooseVersion("11.10")
+            and defer_recalculation
+        ):
+            # send one request for all the recipes in the run
+            self.defer_recalculation(jamf_url)
+            packages_recalculated = "deferred"
+        elif (pkg_api_mode or jcds2_mode) and APLooseVersion(
             jamf_pro_version
         ) >= APLooseVersion("11.10"):
             # check token using oauth or basic auth depending on the credentials given
@@ -23,16 +23,24 @@ Requirements for uploading to the AWS S3 API endpoint:
 To resolve the dependencies, run: /usr/local/autopkg/python -m pip install boto3
 """
 
+import errno
+import fcntl
 import hashlib
 import json
 import os.path
+import plistlib
+import re
 import shutil
+import stat
 import subprocess
 import sys
+import tempfile
 import threading
+import zipfile
 
-from shutil import copyfile
-from time import sleep
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from time import monotonic, sleep
 from urllib.parse import urlparse, quote
 import xml.etree.ElementTree as ElementTree
 from xml.sax.saxutils import escape
@@ -46,77 +54,529 @@ sys.path.insert(0, os.path.dirname(__file__))
 
 from JamfUploaderBase import (  # pylint: disable=import-error, wrong-import-position
     JamfUploaderBase,
+    run_deferred_recalculations,
 )
 
+# size of the blocks read when hashing a package
+HASH_BLOCK_SIZE = 8 * 1024 * 1024
+
+# name of the file in RECIPE_CACHE_DIR that stores the hashes of previous packages
+HASH_CACHE_FILE = "jamf_upload_pkg_hashes.json"
+HASH_CACHE_LOCK = threading.Lock()
+
+# name of the file at the root of a File Share Distribution Point that stores the
+# sizes and hashes of the packages copied to it
+SMB_MANIFEST_FILE = ".jamf_upload_manifest.json"
+SMB_MANIFEST_LOCK = threading.Lock()
+
+# files that are uploaded when pkg_batch is a directory
+BATCH_PKG_EXTENSIONS = (".pkg", ".mpkg", ".dmg", ".zip")
+
+# keys of the recipe that belong to a single package, which are not passed on to the
+# packages of a batch upload
+BATCH_PKG_KEYS = (
+    "pkg_batch",
+    "pkg_path",
+    "pathname",
+    "pkg_name",
+    "pkg_display_name",
+    "version",
+    "jamfpackageuploader_summary_result",
+)
 
-class ProgressPercentage(object):
-    """Class for displaying upload progress - used for jcds2_mode only"""
+# minimum number of seconds between reports of the progress of a transfer
+PROGRESS_INTERVAL = 5
+TRANSFERS_LOCK = threading.Lock()
+
+# days of the week as used in pkg_bandwidth_schedule, in the order of datetime.weekday()
+BANDWIDTH_SCHEDULE_DAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
+# bundle members that are stored in a zip without compressing them again
+COMPRESSED_EXTENSIONS = (
+    ".gz",
+    ".bz2",
+    ".xz",
+    ".zip",
+    ".pkg",
+    ".dmg",
+    ".cpgz",
+    ".pbzx",
+    ".png",
+    ".jpg",
+)
+COMPRESSED_MAGIC = (
+    b"\x1f\x8b",  # gzip
+    b"BZh",  # bzip2
+    b"\xfd7zXZ\x00",  # xz
+    b"PK\x03\x04",  # zip
+    b"pbzx",  # Apple pbzx
+    b"xar!",  # flat package
+    b"bvx",  # lzfse
+)
 
-    def __init__(self, filename):
+
+class FilePart(object):
+    """Read-only file object for one part of a file, so that a part of a multipart upload
+    is streamed from the file instead of being read into memory. If callback is given,
+    it is called with the number of bytes of the part sent as they are read, and with a
+    negative number if the part is rewound to be sent again. As with s3transfer's
+    streams, reads are only reported while the part is being sent to S3, not while
+    botocore reads it to calculate a checksum."""
+
+    def __init__(self, filename, offset, size, callback=None):
+        self._file = open(filename, "rb")  # pylint: disable=consider-using-with
+        self._offset = offset
+        self._size = max(min(size, os.fstat(self._file.fileno()).st_size - offset), 0)
+        self._position = 0
+        self._callback = callback
+        self._transferring = True
+        self._reported = 0
+        self._file.seek(offset)
+
+    def __len__(self):
+        return self._size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def read(self, size=-1):
+        """Read up to size bytes, without going past the end of the part"""
+        remaining = self._size - self._position
+        if size is None or size < 0 or size > remaining:
+            size = remaining
+        data = self._file.read(size)
+        self._position += len(data)
+        if self._callback and self._transferring and self._position > self._reported:
+            self._callback(self._position - self._reported)
+            self._reported = self._position
+        return data
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        """Move to a position within the part"""
+        if whence == os.SEEK_CUR:
+            offset += self._position
+        elif whence == os.SEEK_END:
+            offset += self._size
+        self._position = max(min(offset, self._size), 0)
+        self._file.seek(self._offset + self._position)
+        if self._callback and self._transferring and self._position < self._reported:
+            self._callback(self._position - self._reported)
+            self._reported = self._position
+        return self._position
+
+    def tell(self):
+        """Return the position within the part"""
+        return self._position
+
+    def seekable(self):
+        """The part can be read again, for example to calculate its checksum"""
+        return True
+
+    def signal_transferring(self):
+        """Report reads from now on, as the part is being sent to S3"""
+        self._transferring = True
+
+    def signal_not_transferring(self):
+        """Stop reporting reads, as the part is not being sent to S3"""
+        self._transferring = False
+
+    def readable(self):
+        """The part can be read"""
+        return True
+
+    def close(self):
+        """Close the file"""
+        self._file.close()
+
+
+class ProgressPercentage(object):
+    """Class for tracking the progress of a package transfer. Called with the number of
+    bytes transferred, it reports the amount transferred, rate and estimated time
+    remaining at most every PROGRESS_INTERVAL seconds, using the output function given
+    (normally the processor's output method). If bandwidth_limit is given (in bytes
+    per second), it also holds back the caller to keep the average rate since the limit
+    was set under the limit"""
+
+    def __init__(
+        self, filename, already_transferred=0, label="", output=None, bandwidth_limit=0
+    ):
         self._filename = filename
+        self._label = label or os.path.basename(filename)
+        self._output = output
         self._size = float(os.path.getsize(filename))
-        self._seen_so_far = 0
+        self._seen_so_far = already_transferred
+        self._already_transferred = already_transferred
         self._lock = threading.Lock()
+        self._start_time = monotonic()
+        self._last_report = self._start_time
+        self._bandwidth_limit = bandwidth_limit
+        self._limit_start_time = self._start_time
+        self._limit_start_bytes = already_transferred
+        self.retries = 0
 
     def __call__(self, bytes_amount):
         # To simplify, assume this is hooked up to a single filename
         with self._lock:
             self._seen_so_far += bytes_amount
-            percentage = (self._seen_so_far / self._size) * 100
-            sys.stdout.write(
-                "\r%s  %s / %s  (%.2f%%)"  # pylint: disable=consider-using-f-string
-                % (self._filename, self._seen_so_far, self._size, percentage)
+            now = monotonic()
+            wait = 0
+            if self._bandwidth_limit:
+                wait = (
+                    self._seen_so_far - self._limit_start_bytes
+                ) / self._bandwidth_limit - (now - self._limit_start_time)
+        if wait > 0:
+            sleep(wait)
+        with self._lock:
+            now = monotonic()
+            if (
+                now - self._last_report < PROGRESS_INTERVAL
+                and self._seen_so_far < self._size
+            ):
+                return
+            self._last_report = now
+            percentage = (self._seen_so_far / self._size) * 100 if self._size else 100
+            line = (
+                f"{self._label}: {self._seen_so_far / 1000000:.1f} of "
+                f"{self._size / 1000000:.1f} MB ({percentage:.0f}%) at "
+                f"{self.throughput():.1f} MB/s, ETA {self.eta():.0f}s"
             )
-            sys.stdout.flush()
+        if self._output:
+            self._output(line, verbose_level=1)
+        else:
+            sys.stdout.write(line + "\n")
+
+    def retry(self):
+        """Count a retried attempt at the transfer"""
+        with self._lock:
+            self.retries += 1
+
+    def restart(self):
+        """Count a retried attempt at a transfer that starts again from the beginning,
+        so the bytes sent by the failed attempt are no longer counted"""
+        with self._lock:
+            self.retries += 1
+            self._seen_so_far = self._already_transferred
+
+    def set_bandwidth_limit(self, bandwidth_limit):
+        """Change the bandwidth limit (in bytes per second, or 0 for no limit) for the
+        rest of the transfer"""
+        with self._lock:
+            if bandwidth_limit != self._bandwidth_limit:
+                self._bandwidth_limit = bandwidth_limit
+                self._limit_start_time = monotonic()
+                self._limit_start_bytes = self._seen_so_far
+
+    def elapsed(self):
+        """Return the number of seconds since the transfer started"""
+        return monotonic() - self._start_time
+
+    def transferred(self):
+        """Return the number of bytes transferred by this process"""
+        return self._seen_so_far - self._already_transferred
+
+    def throughput(self):
+        """Return the average transfer rate so far in MB/s"""
+        elapsed = self.elapsed()
+        return self.transferred() / elapsed / 1000000 if elapsed else 0.0
+
+    def eta(self):
+        """Return the estimated number of seconds until the transfer is complete"""
+        rate = self.throughput() * 1000000
+        remaining = max(self._size - self._seen_so_far, 0)
+        return remaining / rate if rate else 0.0
+
+    def summary(self):
+        """Return a one-line summary of the transfer"""
+        summary = (
+            f"{self.transferred() / 1000000:.1f} MB transferred in "
+            f"{self.elapsed():.1f} seconds ({self.throughput():.1f} MB/s)"
+        )
+        if self._already_transferred:
+            summary += (
+                f", {self._already_transferred / 1000000:.1f} MB resumed from a "
+                "previous run"
+            )
+        if self.retries:
+            summary += f", {self.retries} retries"
+        return summary
+
+    def record(self):
+        """Return the details of the transfer, for the summary of the processor"""
+        return {
+            "transfer": self._label,
+            "bytes": int(self._size),
+            "transferred_bytes": self.transferred(),
+            "resumed_bytes": self._already_transferred,
+            "seconds": round(self.elapsed(), 3),
+            "mb_per_second": round(self.throughput(), 3),
+            "retries": self.retries,
+        }
 
 
 class JamfPackageUploaderBase(JamfUploaderBase):
     """Class for functions used to upload a package to Jamf"""
 
+    def start_transfer(self, pkg_path, label, already_transferred=0, bandwidth_limit=0):
+        """Return a ProgressPercentage for a transfer of the package, which is added
+        to the transfers reported in the summary of the processor"""
+        progress = ProgressPercentage(
+            pkg_path,
+            already_transferred,
+            label=label,
+            output=self.output,
+            bandwidth_limit=bandwidth_limit,
+        )
+        # transfers to File Share DPs are started from several threads at once
+        with TRANSFERS_LOCK:
+            if not hasattr(self, "transfers"):
+                self.transfers = []  # pylint: disable=attribute-defined-outside-init
+            self.transfers.append(progress)
+        return progress
+
+    def calculate_digests(
+        self,
+        filename,
+        algorithms=("sha512",),
+        destination=None,
+        block_size=HASH_BLOCK_SIZE,
+        progress=None,
+    ):
+        """calculate several hashes of the package in a single read, for example
+        ("sha512", "sha3_512", "md5", "sha256"). Returns a dictionary of hex digests.
+
+        Each block is hashed by all the algorithms in parallel (hashlib releases the GIL),
+        while the next block is read into a second buffer. If a destination path is
+        given, each block is also written there, so that the package is copied and
+        hashed with the same read, and the hashes are those of the bytes written."""
+        hashers = {algorithm: hashlib.new(algorithm) for algorithm in algorithms}
+        buffers = [bytearray(block_size), bytearray(block_size)]
+        pending = []
+        with open(filename, "rb", buffering=0) as f, open(
+            destination or os.devnull, "wb"
+        ) as out, ThreadPoolExecutor(max_workers=max(len(hashers), 1)) as executor:
+            index = 0
+            while True:
+                mv = memoryview(buffers[index])
+                n = f.readinto(mv)
+                # the previous block must be hashed before we move on, as its buffer
+                # is about to be reused
+                for future in pending:
+                    future.result()
+                if not n:
+                    break
+                pending = [executor.submit(h.update, mv[:n]) for h in hashers.values()]
+                if destination:
+                    out.write(mv[:n])
+                if progress:
+                    progress(n)
+                index = 1 - index
+        return {algorithm: h.hexdigest() for algorithm, h in hashers.items()}
+
+    def get_pkg_file_id(self, pkg_path):
+        """Return the details used to tell whether a package has changed since it was
+        last hashed"""
+        file_stat = os.stat(os.path.realpath(pkg_path))
+        return {
+            "size": file_stat.st_size,
+            "mtime_ns": file_stat.st_mtime_ns,
+            "inode": file_stat.st_ino,
+            "device": file_stat.st_dev,
+        }
+
+    def load_cached_pkg_digests(self, pkg_path, algorithms, recipe_cache_dir=None):
+        """Return the hashes of a package stored in RECIPE_CACHE_DIR by a previous run,
+        if the file has not changed since. A file is considered unchanged if its size,
+        modification time, inode and device are the same."""
+        if not recipe_cache_dir:
+            return {}
+        try:
+            with open(
+                os.path.join(recipe_cache_dir, HASH_CACHE_FILE), "r", encoding="utf-8"
+            ) as f:
+                entry = json.load(f).get(os.path.realpath(pkg_path), {})
+        except (OSError, ValueError, AttributeError):
+            return {}
+        if not isinstance(entry, dict) or entry.get("file") != self.get_pkg_file_id(
+            pkg_path
+        ):
+            return {}
+        return {
+            algorithm: entry["digests"][algorithm]
+            for algorithm in algorithms
+            if algorithm in entry.get("digests", {})
+        }
+
+    def save_pkg_digests(self, pkg_path, digests, recipe_cache_dir=None):
+        """Store the hashes of a package in RECIPE_CACHE_DIR for future runs"""
+        if not recipe_cache_dir or not os.path.isdir(recipe_cache_dir):
+            return
+        cache_file = os.path.join(recipe_cache_dir, HASH_CACHE_FILE)
+        with HASH_CACHE_LOCK:
+            try:
+                with open(cache_file, "r", encoding="utf-8") as f:
+                    hash_cache = json.load(f)
+            except (OSError, ValueError):
+                hash_cache = {}
+
+            real_path = os.path.realpath(pkg_path)
+            file_id = self.get_pkg_file_id(pkg_path)
+            entry = hash_cache.get(real_path, {})
+            if not isinstance(entry, dict) or entry.get("file") != file_id:
+                entry = {"file": file_id, "digests": {}}
+            entry["digests"].update(digests)
+
+            # drop any packages that no longer exist
+            hash_cache = {
+                path: value
+                for path, value in hash_cache.items()
+                if os.path.exists(path)
+            }
+            hash_cache[real_path] = entry
+            try:
+                tmp_cache_file = f"{cache_file}.{os.getpid()}.tmp"
+                with open(tmp_cache_file, "w", encoding="utf-8") as f:
+                    json.dump(hash_cache, f, indent=2)
+                os.replace(tmp_cache_file, cache_file)
+            except OSError as e:
+                self.output(
+                    f"WARNING: could not write {cache_file}: {e}", verbose_level=1
+                )
+
+    def get_pkg_digests(self, pkg_path, algorithms, recipe_cache_dir=None):
+        """Return the hashes of a package, only calculating those that were not stored
+        in RECIPE_CACHE_DIR by a previous run"""
+        digests = self.load_cached_pkg_digests(pkg_path, algorithms, recipe_cache_dir)
+        missing = [algorithm for algorithm in algorithms if algorithm not in digests]
+        if not missing:
+            self.output(f"Using cached hashes of unchanged package {pkg_path}")
+            return digests
+        new_digests = self.calculate_digests(pkg_path, missing)
+        self.save_pkg_digests(pkg_path, new_digests, recipe_cache_dir)
+        digests.update(new_digests)
+        return digests
+
+    def start_pkg_digests(self, pkg_path, algorithms, recipe_cache_dir, background):
+        """Begin working out the hashes of the package that will be needed later.
+
+        Hashes from a previous run are reused. Otherwise, if background is set, they are
+        calculated in a separate thread, so that this overlaps with the requests made to
+        Jamf Pro. If not, they are calculated from the bytes read when the package is
+        first copied to a file share (see pending_pkg_digests). Use get_pkg_digest to
+        obtain a hash, which waits for it to be calculated if necessary, including by a
+        copy in another thread.
+        """
+        # pylint: disable=attribute-defined-outside-init
+        self.pkg_digest_args = (pkg_path, list(algorithms), recipe_cache_dir)
+        self.pkg_digests = self.load_cached_pkg_digests(
+            pkg_path, algorithms, recipe_cache_dir
+        )
+        self.pkg_digests_future = None
+        self.pkg_digests_claim = None
+        self.pkg_digests_claimed_by = None
+        self.pkg_digests_lock = threading.RLock()
+        if len(self.pkg_digests) == len(algorithms):
+            self.output(f"Using cached hashes of unchanged package {pkg_path}")
+        elif background:
+            self.output(
+                f"Calculating {', '.join(algorithms)} hashes of {pkg_path} "
+                "in the background",
+                verbose_level=2,
+            )
+            executor = ThreadPoolExecutor(max_workers=1)
+            self.pkg_digests_future = executor.submit(
+                self.get_pkg_digests, pkg_path, algorithms, recipe_cache_dir
+            )
+            executor.shutdown(wait=False)
+
+    def pending_pkg_digests(self):
+        """Return the hashes of the package still to be calculated, if they are waiting
+        to be calculated while the package is copied. Only the first caller is given
+        them, so that copies to several file shares at once do not all hash the package.
+        The caller must pass the result to add_pkg_digests, even if the copy fails, as
+        other threads wait for it in get_pkg_digest.
+        """
+        with self.pkg_digests_lock:
+            if self.pkg_digests_future or self.pkg_digests_claim:
+                return []
+            pending = [a for a in self.pkg_digest_args[1] if a not in self.pkg_digests]
+            if pending:
+                self.pkg_digests_claim = Future()
+                self.pkg_digests_claimed_by = threading.get_ident()
+            return pending
+
+    def add_pkg_digests(self, digests):
+        """Record hashes of the package calculated while it was copied. If the copy
+        failed, digests is empty and the hashes can be claimed by another copy."""
+        with self.pkg_digests_lock:
+            self.pkg_digests.update(digests)
+            claim = self.pkg_digests_claim
+            if claim and self.pkg_digests_claimed_by == threading.get_ident():
+                self.pkg_digests_claim = None
+                self.pkg_digests_claimed_by = None
+            else:
+                claim = None
+        if digests:
+            self.save_pkg_digests(
+                self.pkg_digest_args[0], digests, self.pkg_digest_args[2]
+            )
+        if claim:
+            claim.set_result(digests)
+
+    def get_pkg_digest(self, algorithm):
+        """Return a hash of the package, waiting for it to be calculated if necessary"""
+        with self.pkg_digests_lock:
+            claim = None
+            if (
+                algorithm not in self.pkg_digests
+                and self.pkg_digests_claimed_by != threading.get_ident()
+            ):
+                claim = self.pkg_digests_claim
+        if claim:
+            # the package is being hashed while it is copied by another thread, so
+            # wait for that rather than reading the package again
+            self.output(
+                f"Waiting for the {algorithm} hash to be calculated during a copy",
+                verbose_level=2,
+            )
+            claim.result()
+        with self.pkg_digests_lock:
+            if algorithm not in self.pkg_digest_args[1]:
+                self.pkg_digest_args[1].append(algorithm)
+            if algorithm not in self.pkg_digests and self.pkg_digests_future:
+                self.pkg_digests.update(self.pkg_digests_future.result())
+                self.pkg_digests_future = None
+            if algorithm not in self.pkg_digests:
+                self.pkg_digests.update(self.get_pkg_digests(*self.pkg_digest_args))
+            return self.pkg_digests.get(algorithm)
+
     def sha512sum(self, filename):
-        """calculate the SHA512 hash of the package
-        (see https://stackoverflow.com/a/44873382)"""
-        h = hashlib.sha512()
-        b = bytearray(128 * 1024)
-        mv = memoryview(b)
-        with open(filename, "rb", buffering=0) as f:
-            for n in iter(lambda: f.readinto(mv), 0):
-                h.update(mv[:n])
-        return h.hexdigest()
+        """calculate the SHA512 hash of the package"""
+        return self.calculate_digests(filename, ["sha512"])["sha512"]
 
     def sha3sum(self, pkg_path):
         """calculate the SHA-3 512 hash of the package"""
-        h = hashlib.sha3_512()
-        b = bytearray(128 * 1024)
-        mv = memoryview(b)
-        with open(pkg_path, "rb", buffering=0) as f:
-            for n in iter(lambda: f.readinto(mv), 0):
-                h.update(mv[:n])
-        return h.hexdigest()
+        return self.calculate_digests(pkg_path, ["sha3_512"])["sha3_512"]
 
     def sha256sum(self, filename):
         """calculate the SHA256 hash of the package"""
-        h = hashlib.sha256()
-        b = bytearray(128 * 1024)
-        mv = memoryview(b)
-        with open(filename, "rb", buffering=0) as f:
-            for n in iter(lambda: f.readinto(mv), 0):
-                h.update(mv[:n])
-        return h.hexdigest()
+        return self.calculate_digests(filename, ["sha256"])["sha256"]
 
     def md5sum(self, filename):
         """calculate the MD5 hash of the package"""
-        h = hashlib.md5()
-        b = bytearray(128 * 1024)
-        mv = memoryview(b)
-        with open(filename, "rb", buffering=0) as f:
-            for n in iter(lambda: f.readinto(mv), 0):
-                h.update(mv[:n])
-        return h.hexdigest()
+        return self.calculate_digests(filename, ["md5"])["md5"]
 
     def zip_pkg_path(self, bundle_path, recipe_cache_dir):
         """Add files from path to a zip file handle.
 
+        The zip contains the bundle itself (not just the contents of the bundle). Files
+        are streamed straight from the bundle into the zip. Members that are already
+        compressed, such as the package payload, are stored rather than compressed
+        again. If deterministic_zip is set, timestamps and permissions are normalised
+        so that the same bundle always gives an identical zip.
+
         Args:
             path (str): Path to folder to zip.
 
@@ -130,34 +590,73 @@ class JamfPackageUploaderBase(JamfUploaderBase):
             self.output("Package object is a bundle. Zipped archive already exists.")
             return zip_name
 
-        # we need to create a zip that contains the package (not just the contents of the package)
-        # to do this, me copy the package into it's own folder, and then zip that folder.
         self.output(
-            f"Package object is a bundle. Converting to zip, will be placed at {recipe_cache_dir}"
-        )
-        pkg_basename = os.path.basename(bundle_path)
-        # make a subdirectory
-        pkg_dir = os.path.join(recipe_cache_dir, "temp", "pkg")
-        os.makedirs(pkg_dir, mode=0o777)
-        # copy the package into pkg_dir
-        shutil.copytree(bundle_path, os.path.join(pkg_dir, pkg_basename))
-        # now rename pkg_dir to the package name (I know, weird)
-        temp_dir = os.path.join(recipe_cache_dir, "temp", pkg_basename)
-        shutil.move(pkg_dir, temp_dir)
-        # now make the zip archive
-        zip_path = shutil.make_archive(
-            temp_dir,
-            "zip",
-            temp_dir,
+            f"Package object is a bundle. Converting to zip, will be placed at "
+            f"{os.path.dirname(zip_name) or recipe_cache_dir}"
         )
-        # move it to the recipe_cache_dir
-        shutil.move(zip_path, zip_name)
-        # clean up
-        shutil.rmtree(os.path.join(recipe_cache_dir, "temp"))
+        deterministic = self.env.get("deterministic_zip")
+        if not deterministic or deterministic == "False":
+            deterministic = False
+
+        pkg_basename = os.path.basename(bundle_path.rstrip("/"))
+        tmp_zip_name = f"{zip_name}.{os.getpid()}.tmp"
+        try:
+            with zipfile.ZipFile(tmp_zip_name, "w", allowZip64=True) as zf:
+                for root, dirs, files in os.walk(bundle_path, followlinks=True):
+                    # walk in a fixed order so that the zip is reproducible
+                    dirs.sort()
+                    arc_root = os.path.join(
+                        pkg_basename, os.path.relpath(root, bundle_path)
+                    )
+                    self.add_to_zip(zf, root, os.path.normpath(arc_root), deterministic)
+                    for name in sorted(files):
+                        self.add_to_zip(
+                            zf,
+                            os.path.join(root, name),
+                            os.path.join(os.path.normpath(arc_root), name),
+                            deterministic,
+                        )
+            os.replace(tmp_zip_name, zip_name)
+        finally:
+            if os.path.exists(tmp_zip_name):
+                os.remove(tmp_zip_name)
 
         self.output(f"Zip file {zip_name} created.")
         return zip_name
 
+    def add_to_zip(self, zf, path, arcname, deterministic=False):
+        """Stream a file or directory into an open zip file"""
+        zinfo = zipfile.ZipInfo.from_file(path, arcname)
+        if deterministic:
+            zinfo.date_time = (1980, 1, 1, 0, 0, 0)
+            mode = 0o755 if zinfo.is_dir() or os.access(path, os.X_OK) else 0o644
+            zinfo.external_attr = (
+                (stat.S_IFDIR if zinfo.is_dir() else stat.S_IFREG) | mode
+            ) << 16
+            if zinfo.is_dir():
+                zinfo.external_attr |= 0x10  # MS-DOS directory flag
+        if zinfo.is_dir():
+            zf.writestr(zinfo, b"")
+            return
+        with open(path, "rb") as src:
+            # compressing data that is already compressed only costs time
+            if self.is_compressed(path, src.read(8)):
+                zinfo.compress_type = zipfile.ZIP_STORED
+            else:
+                zinfo.compress_type = zipfile.ZIP_DEFLATED
+            src.seek(0)
+            with zf.open(
+                zinfo, "w", force_zip64=zinfo.file_size > zipfile.ZIP64_LIMIT
+            ) as dst:
+                shutil.copyfileobj(src, dst, HASH_BLOCK_SIZE)
+
+    def is_compressed(self, path, header):
+        """Return True if a file is already compressed, judging by its extension or the
+        first bytes of its contents"""
+        if path.lower().endswith(COMPRESSED_EXTENSIONS):
+            return True
+        return header.startswith(COMPRESSED_MAGIC)
+
     # ------------------------------------------------------------------------
     # Beginning of functions for uploading to Local Fileshare Distribution Points
 
@@ -183,17 +682,465 @@ class JamfPackageUploaderBase(JamfUploaderBase):
             )
             return None
 
-    def copy_pkg(self, mount_share, pkg_path, pkg_name):
-        """Copy package from AutoPkg Cache to local or mounted Distribution Point"""
+    def get_copy_block_size(self):
+        """Return the size of the blocks used to copy packages to file shares, from
+        smb_copy_block_size in MB"""
+        block_size = self.env.get("smb_copy_block_size")
+        if not block_size:
+            return HASH_BLOCK_SIZE
+        try:
+            return max(int(float(block_size) * 1024 * 1024), 64 * 1024)
+        except ValueError as e:
+            raise ProcessorError(
+                f"smb_copy_block_size must be a number of MB, not {block_size}"
+            ) from e
+
+    def parse_bandwidth_schedule(self, schedule):
+        """Return the windows of pkg_bandwidth_schedule as a list of (days, start,
+        end, limit) tuples, with the start and end in minutes after midnight and the
+        limit in MB/s. The schedule is a dictionary or a comma-separated string of
+        entries such as "Mon-Fri 08:00-18:00=2", where the days are optional and a
+        window may end after midnight, e.g. "22:00-06:00=0"."""
+        if isinstance(schedule, dict):
+            entries = [(str(window), limit) for window, limit in schedule.items()]
+        else:
+            entries = [
+                tuple(entry.split("=", 1))
+                for entry in re.split(r"[,;]", str(schedule))
+                if entry.strip()
+            ]
+        windows = []
+        for entry in entries:
+            try:
+                window, limit = entry
+                match = re.fullmatch(
+                    r"(?:([a-z]{3})(?:-([a-z]{3}))?\s+)?"
+                    r"(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})",
+                    window.strip().lower(),
+                )
+                first_day, last_day, start_h, start_m, end_h, end_m = match.groups()
+                days = set(range(7))
+                if first_day:
+                    first = BANDWIDTH_SCHEDULE_DAYS.index(first_day)
+                    last = BANDWIDTH_SCHEDULE_DAYS.index(last_day or first_day)
+                    days = {(first + n) % 7 for n in range((last - first) % 7 + 1)}
+                windows.append(
+                    (
+                        days,
+                        int(start_h) * 60 + int(start_m),
+                        int(end_h) * 60 + int(end_m),
+                        float(limit),
+                    )
+                )
+            except (AttributeError, ValueError) as e:
+                raise ProcessorError(
+                    f"Invalid pkg_bandwidth_schedule entry: {'='.join(map(str, entry))}"
+                ) from e
+        return windows
+
+    def get_bandwidth_limit(self):
+        """Return the bandwidth limit for package transfers in bytes per second, or 0
+        for no limit. The limit is taken from the first window of
+        pkg_bandwidth_schedule that covers the current local time, otherwise from
+        pkg_bandwidth_limit, both in MB/s."""
+        windows = []
+        if self.env.get("pkg_bandwidth_schedule"):
+            windows = self.parse_bandwidth_schedule(
+                self.env.get("pkg_bandwidth_schedule")
+            )
+        now = datetime.now()
+        minutes = now.hour * 60 + now.minute
+        for days, start, end, limit in windows:
+            if start < end:
+                in_window = start <= minutes < end
+            else:
+                # the window runs past midnight, or all day if start and end are equal
+                in_window = minutes >= start or minutes < end
+            if now.weekday() in days and in_window:
+                break
+        else:
+            try:
+                limit = float(self.env.get("pkg_bandwidth_limit") or 0)
+            except ValueError as e:
+                raise ProcessorError(
+                    "pkg_bandwidth_limit must be a number of MB/s, not "
+                    f"{self.env.get('pkg_bandwidth_limit')}"
+                ) from e
+        bandwidth_limit = max(int(limit * 1024 * 1024), 0)
+        if bandwidth_limit:
+            self.output(
+                f"Package transfers are limited to {limit:g} MB/s", verbose_level=2
+            )
+        return bandwidth_limit
+
+    def copy_file(self, source, destination, block_size, progress=None):
+        """Copy a file in blocks of block_size, letting the kernel copy the data with
+        copy_file_range or sendfile where it supports them, so that it does not pass
+        through Python. Falls back to reading and writing each block. progress is
+        called with the size of each block copied."""
+        with open(source, "rb") as fsrc, open(destination, "wb") as fdst:
+            size = os.fstat(fsrc.fileno()).st_size
+            for method in ("copy_file_range", "sendfile"):
+                if not hasattr(os, method):
+                    continue
+                offset = 0
+                try:
+                    while offset < size:
+                        count = min(block_size, size - offset)
+                        if method == "copy_file_range":
+                            n = os.copy_file_range(
+                                fsrc.fileno(), fdst.fileno(), count, offset, offset
+                            )
+                        else:
+                            n = os.sendfile(fdst.fileno(), fsrc.fileno(), offset, count)
+                        if not n:
+                            break
+                        offset += n
+                        if progress:
+                            progress(n)
+                except OSError as e:
+                    # not supported between these files, so try the next method, unless
+                    # some of the file has already been copied
+                    if offset or e.errno not in (
+                        errno.EINVAL,
+                        errno.ENOSYS,
+                        errno.EXDEV,
+                        errno.ENOTSOCK,
+                        errno.EOPNOTSUPP,
+                        errno.EBADF,
+                    ):
+                        raise
+                    continue
+                if offset == size:
+                    return method
+                raise OSError(
+                    errno.EIO, f"{method} stopped after {offset} of {size} bytes"
+                )
+            while True:
+                data = fsrc.read(block_size)
+                if not data:
+                    break
+                fdst.write(data)
+                if progress:
+                    progress(len(data))
+        return "read/write"
+
+    def copy_pkg(self, mount_share, pkg_path, pkg_name, hash_algorithms=None):
+        """Copy package from AutoPkg Cache to local or mounted Distribution Point.
+        If hash_algorithms are given, the package is hashed as it is copied and the
+        hashes are returned.
+
+        If smb_verify_copy is set, the copy is read back from the share once it has
+        been written, and a copy whose SHA-512 hash does not match the package is
+        removed. The copy is made by the kernel where possible. The copy speed is
+        reported for each destination."""
+        verify = self.env.get("smb_verify_copy")
+        if not verify or verify == "False":
+            verify = False
+        block_size = self.get_copy_block_size()
+        digests = {}
+        dirname = f"/Volumes{urlparse(mount_share).path}"
+        destination_pkg_path = os.path.join(dirname, "Packages", pkg_name)
         if os.path.isfile(pkg_path):
-            dirname = f"/Volumes{urlparse(mount_share).path}"
-            destination_pkg_path = os.path.join(dirname, "Packages", pkg_name)
             self.output(f"Copying {pkg_name} to {destination_pkg_path}")
-            copyfile(pkg_path, destination_pkg_path)
+            algorithms = list(hash_algorithms or [])
+            bandwidth_limit = self.get_bandwidth_limit()
+            if bandwidth_limit:
+                # smaller blocks keep the pace of a throttled copy steady
+                block_size = min(block_size, max(bandwidth_limit, 64 * 1024))
+            progress = self.start_transfer(
+                pkg_path,
+                f"File Share DP {mount_share}",
+                bandwidth_limit=bandwidth_limit,
+            )
+            if algorithms:
+                digests = self.calculate_digests(
+                    pkg_path,
+                    algorithms,
+                    destination=destination_pkg_path,
+                    block_size=block_size,
+                    progress=progress,
+                )
+                method = "read/write"
+            else:
+                method = self.copy_file(
+                    pkg_path, destination_pkg_path, block_size, progress=progress
+                )
+            size = os.path.getsize(pkg_path)
+            self.output(
+                f"Copied to {destination_pkg_path} using {method}: "
+                f"{progress.summary()}",
+                verbose_level=1,
+            )
+            if os.path.getsize(destination_pkg_path) != size or (
+                verify
+                and self.read_back_sha512(destination_pkg_path, block_size)
+                != (digests.get("sha512") or self.get_pkg_digest("sha512"))
+            ):
+                os.remove(destination_pkg_path)
+                raise ProcessorError(
+                    f"ERROR: copy of {pkg_name} to {mount_share} does not match "
+                    "the package, so it has been removed"
+                )
+            if verify:
+                self.output(
+                    f"Verified SHA-512 of {destination_pkg_path}", verbose_level=1
+                )
         if os.path.isfile(destination_pkg_path):
             self.output("Package copy successful")
         else:
             self.output("Package copy failed")
+        return digests
+
+    def read_back_sha512(self, path, block_size=HASH_BLOCK_SIZE):
+        """Return the SHA-512 hash of a copied file as read back from its destination.
+        The file is flushed to the share and then read without the local cache where
+        the platform allows it, so that the hash is of what the share holds rather
+        than of what was written."""
+        self.output(f"Reading back {path} to verify it", verbose_level=2)
+        sha512 = hashlib.sha512()
+        with open(path, "rb") as f:
+            os.fsync(f.fileno())
+            if sys.platform == "darwin":
+                # the fcntl module may not define F_NOCACHE
+                fcntl.fcntl(f.fileno(), getattr(fcntl, "F_NOCACHE", 48), 1)
+            elif hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+            for block in iter(lambda: f.read(block_size), b""):
+                sha512.update(block)
+        return sha512.hexdigest()
+
+    def get_smb_manifest_path(self, mount_share):
+        """Return the path of the manifest of package hashes on a mounted share"""
+        return os.path.join(f"/Volumes{urlparse(mount_share).path}", SMB_MANIFEST_FILE)
+
+    def load_smb_manifest(self, mount_share):
+        """Return the manifest of package sizes and hashes stored on a mounted share"""
+        try:
+            with open(
+                self.get_smb_manifest_path(mount_share), "r", encoding="utf-8"
+            ) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return manifest if isinstance(manifest, dict) else {}
+
+    def save_smb_manifest_entry(self, mount_share, pkg_name, existing_pkg_path, sha512):
+        """Record the size, modification time and hash of a package on a mounted share
+        in the share's manifest. The manifest is updated under a lock, held by this
+        process and, where the share supports it, on a lock file next to the manifest,
+        so that concurrent uploads to the same share do not lose each other's entries.
+        """
+        manifest_path = self.get_smb_manifest_path(mount_share)
+        file_stat = os.stat(existing_pkg_path)
+        tmp_manifest_path = None
+        try:
+            with SMB_MANIFEST_LOCK, open(
+                manifest_path + ".lock", "a", encoding="utf-8"
+            ) as lock_file:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                except OSError:
+                    self.output(
+                        f"Could not lock {manifest_path}, updating it anyway",
+                        verbose_level=2,
+                    )
+                manifest = self.load_smb_manifest(mount_share)
+                manifest[pkg_name] = {
+                    "size": file_stat.st_size,
+                    "mtime": file_stat.st_mtime,
+                    "sha512": sha512,
+                }
+                fd, tmp_manifest_path = tempfile.mkstemp(
+                    prefix=SMB_MANIFEST_FILE + ".", dir=os.path.dirname(manifest_path)
+                )
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(manifest, f, indent=2)
+                os.replace(tmp_manifest_path, manifest_path)
+                tmp_manifest_path = None
+        except OSError as e:
+            self.output(
+                f"WARNING: could not write {manifest_path}: {e}", verbose_level=1
+            )
+        finally:
+            if tmp_manifest_path:
+                self.remove_temp_files(tmp_manifest_path)
+
+    def check_local_pkg_content(
+        self, mount_share, pkg_path, pkg_name, existing_pkg_path
+    ):
+        """Return True if the package on a mounted share has the same content as the
+        package to be uploaded. The sizes are compared first. If they match, the hash
+        stored in the share's manifest is used, as long as the file on the share has not
+        changed since it was recorded. Otherwise the file on the share is hashed and the
+        result stored in the manifest for next time."""
+        existing_size = os.path.getsize(existing_pkg_path)
+        if existing_size != os.path.getsize(pkg_path):
+            self.output(
+                f"Existing package {existing_pkg_path} differs in size from {pkg_path}",
+                verbose_level=1,
+            )
+            return False
+        sha512 = self.get_pkg_digest("sha512")
+        entry = self.load_smb_manifest(mount_share).get(pkg_name)
+        if (
+            isinstance(entry, dict)
+            and entry.get("size") == existing_size
+            and entry.get("mtime") == os.path.getmtime(existing_pkg_path)
+        ):
+            existing_sha512 = entry.get("sha512")
+            self.output(
+                f"Using hash of {existing_pkg_path} from {SMB_MANIFEST_FILE}",
+                verbose_level=2,
+            )
+        else:
+            self.output(f"Calculating hash of {existing_pkg_path}", verbose_level=1)
+            existing_sha512 = self.sha512sum(existing_pkg_path)
+            self.save_smb_manifest_entry(
+                mount_share, pkg_name, existing_pkg_path, existing_sha512
+            )
+        if existing_sha512 != sha512:
+            self.output(
+                f"Existing package {existing_pkg_path} differs in content from "
+                f"{pkg_path}",
+                verbose_level=1,
+            )
+            return False
+        return True
+
+    def upload_to_smb_share(
+        self, smb_share, pkg_path, pkg_name, replace, compare_content=False
+    ):
+        """Mount a File Share Distribution Point if required, copy the package to it
+        unless it is already there, and unmount it again. If compare_content is set, an
+        existing package is only kept if its content is the same as the package to be
+        uploaded, whatever the value of replace. Returns a dictionary with the result of
+        the upload and the time it took"""
+        smb_url, smb_user, smb_password = smb_share[0], smb_share[1], smb_share[2]
+        result = {"share": smb_url, "result": "", "seconds": 0.0}
+        start = monotonic()
+        self.output(f"Begin upload to File Share DP {smb_url}", verbose_level=1)
+        try:
+            if "smb://" in smb_url:
+                # mount the share
+                self.mount_smb(smb_url, smb_user, smb_password)
+            # check for existing package
+            local_pkg = self.check_local_pkg(smb_url, pkg_name)
+            if local_pkg and compare_content:
+                copy = not self.check_local_pkg_content(
+                    smb_url, pkg_path, pkg_name, local_pkg
+                )
+                if not copy:
+                    self.output(
+                        f"Not replacing existing {pkg_name} on {smb_url} as its "
+                        "content is unchanged"
+                    )
+            else:
+                copy = not local_pkg or replace
+                if local_pkg and replace:
+                    self.output(
+                        "Replacing existing package as 'replace_pkg' is set to True",
+                        verbose_level=1,
+                    )
+                elif local_pkg:
+                    self.output(
+                        f"Not replacing existing {pkg_name} on {smb_url} as "
+                        f"'replace_pkg' is set to {replace}. Use replace_pkg='True' "
+                        "to enforce."
+                    )
+            if copy:
+                # copy the file, calculating the hashes of the package on the first copy
+                hash_algorithms = self.pending_pkg_digests()
+                digests = {}
+                try:
+                    digests = self.copy_pkg(
+                        smb_url, pkg_path, pkg_name, hash_algorithms=hash_algorithms
+                    )
+                finally:
+                    if hash_algorithms:
+                        self.add_pkg_digests(digests)
+                if compare_content:
+                    self.save_smb_manifest_entry(
+                        smb_url,
+                        pkg_name,
+                        os.path.join(
+                            f"/Volumes{urlparse(smb_url).path}", "Packages", pkg_name
+                        ),
+                        self.get_pkg_digest("sha512"),
+                    )
+                result["result"] = "copied"
+            else:
+                result["result"] = "skipped"
+        except (OSError, subprocess.CalledProcessError, ProcessorError) as e:
+            self.output(f"ERROR: upload to File Share DP {smb_url} failed: {e}")
+            result["result"] = "failed"
+            result["error"] = str(e)
+        finally:
+            if "smb://" in smb_url:
+                # unmount the share
+                try:
+                    self.umount_smb(smb_url)
+                except (OSError, subprocess.CalledProcessError) as e:
+                    self.output(
+                        f"WARNING: could not unmount {smb_url}: {e}", verbose_level=1
+                    )
+            result["seconds"] = monotonic() - start
+        self.output(
+            f"Finished upload to File Share DP {smb_url}: {result['result']} "
+            f"in {result['seconds']:.1f}s",
+            verbose_level=1,
+        )
+        return result
+
+    def upload_to_smb_shares(self, smb_shares, pkg_path, pkg_name, replace):
+        """Upload the package to each File Share Distribution Point, several at a time
+        if smb_max_workers is set. Shares with the same path, such as
+        smb://dp1/CasperShare and smb://dp2/CasperShare, are uploaded one after another,
+        as they are mounted at the same place in /Volumes. Returns the result for each
+        share, in the order the shares were given"""
+        max_workers = self.env.get("smb_max_workers")
+        compare_content = self.env.get("smb_compare_content")
+        if not compare_content or compare_content == "False":
+            compare_content = False
+        try:
+            max_workers = max(1, min(int(max_workers or 1), len(smb_shares)))
+        except ValueError as e:
+            raise ProcessorError(
+                f"smb_max_workers must be a number, not {max_workers}"
+            ) from e
+        share_groups = {}
+        for index, smb_share in enumerate(smb_shares):
+            mount_path = urlparse(smb_share[0]).path.rstrip("/")
+            share_groups.setdefault(mount_path, []).append(index)
+        max_workers = min(max_workers, len(share_groups))
+        self.output(
+            f"Uploading to {len(smb_shares)} File Share DPs with {max_workers} workers",
+            verbose_level=2,
+        )
+
+        results = [None] * len(smb_shares)
+
+        def upload_share_group(indexes):
+            for index in indexes:
+                results[index] = self.upload_to_smb_share(
+                    smb_shares[index], pkg_path, pkg_name, replace, compare_content
+                )
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(upload_share_group, share_groups.values()))
+
+        self.output("File Share DP upload summary:")
+        for result in results:
+            self.output(
+                f"  {result['share']}: {result['result']} in {result['seconds']:.1f}s"
+                + (f" ({result['error']})" if result.get("error") else "")
+            )
+        failed = [result["share"] for result in results if result["result"] == "failed"]
+        if failed:
+            raise ProcessorError(
+                f"ERROR: upload to File Share DPs failed: {', '.join(failed)}"
+            )
+        return results
 
     # End of functions for upload to Local Fileshare Distribution Points
     # ------------------------------------------------------------------------
@@ -219,8 +1166,12 @@ class JamfPackageUploaderBase(JamfUploaderBase):
             "--max-time",
             str("3600"),
         ]
+        bandwidth_limit = self.get_bandwidth_limit()
+        if bandwidth_limit:
+            additional_curl_opts += ["--limit-rate", str(bandwidth_limit)]
 
         request = "POST"
+        progress = self.start_transfer(pkg_path, "dbfileupload")
         r = self.curl(
             request=request,
             url=url,
@@ -228,9 +1179,25 @@ class JamfPackageUploaderBase(JamfUploaderBase):
             additional_curl_opts=additional_curl_opts,
             data=pkg_path,
             endpoint_type="package_upload",
+            progress=progress,
         )
 
+        # the package record is created outside the Classic API, so the IDs of packages
+        # cached during this run are brought up to date here
+        if r.status_code and r.status_code < 400:
+            try:
+                new_pkg_id = ElementTree.fromstring(r.output).findtext("id")
+            except (ElementTree.ParseError, TypeError):
+                new_pkg_id = None
+            if new_pkg_id:
+                self.cache_obj_ids(
+                    jamf_url, "package", "name", {pkg_name: int(new_pkg_id)}
+                )
+            else:
+                self.forget_cached_obj_ids(jamf_url, "package")
+
         self.output(f"HTTP response: {r.status_code}", verbose_level=1)
+        self.output(f"dbfileupload: {progress.summary()}", verbose_level=1)
         return r
 
     # End of function for uploading to Local Fileshare Distribution Points
@@ -240,75 +1207,50 @@ class JamfPackageUploaderBase(JamfUploaderBase):
     def upload_pkg(self, pkg_path, pkg_name, pkg_id, sleep_time, jamf_url, token):
         """Upload a package to a Cloud Distribution Point using the v1/packages endpoint"""
 
-        # if pkg_name does not match the package name in pkg_path we copy the package locally first
-        pkg_dirname = os.path.dirname(pkg_path)
-        pkg_basename = os.path.basename(pkg_path)
-        tmp_pkg_path = ""
-        if pkg_basename != pkg_name:
-            tmp_pkg_path = os.path.join(pkg_dirname, pkg_name)
-            shutil.copyfile(pkg_path, tmp_pkg_path)
+        # if pkg_name does not match the package name in pkg_path, the package is sent
+        # under pkg_name rather than making a renamed copy of it
+        upload_filename = ""
+        if os.path.basename(pkg_path) != pkg_name:
+            upload_filename = pkg_name
             self.output(
-                (
-                    f"Package name does not match path, so package copied from {pkg_path} to",
-                    f"{tmp_pkg_path}",
-                ),
+                f"Package name does not match path, so {pkg_path} will be uploaded as "
+                f"{pkg_name}",
                 verbose_level=2,
             )
-            pkg_path = tmp_pkg_path
 
         object_type = "package_v1"
         url = f"{jamf_url}/{self.api_endpoints(object_type)}/{pkg_id}/upload"
-        count = 0
-        while True:
-            count += 1
-            self.output(
-                f"Package upload attempt {count}",
-                verbose_level=2,
-            )
-
-            request = "POST"
-            r = self.curl(
-                request=request,
-                url=url,
-                token=token,
-                data=pkg_path,
-                endpoint_type="package_v1",
-            )
-
-            # check HTTP response
-            if self.status_check(r, "Package upload", pkg_name, request) == "break":
-                break
-            if count > 5:
-                self.output("WARNING: Package upload did not succeed after 5 attempts")
-                self.output(
-                    f"HTTP POST Response Code: {r.status_code}",
-                    verbose_level=1,
-                )
-                raise ProcessorError("ERROR: Package upload failed ")
-            if int(sleep_time) > 30:
-                sleep(int(sleep_time))
-            else:
-                sleep(30)
+        request = "POST"
+        additional_curl_opts = []
+        bandwidth_limit = self.get_bandwidth_limit()
+        if bandwidth_limit:
+            additional_curl_opts = ["--limit-rate", str(bandwidth_limit)]
+        progress = self.start_transfer(pkg_path, "v1/packages upload")
+        r = self.curl_with_retry(
+            "Package upload",
+            pkg_name,
+            sleep_time,
+            on_retry=progress.restart,
+            idempotent=True,
+            request=request,
+            url=url,
+            token=token,
+            data=pkg_path,
+            endpoint_type="package_v1",
+            upload_filename=upload_filename,
+            additional_curl_opts=additional_curl_opts,
+            progress=progress,
+        )
 
         self.output(f"HTTP response: {r.status_code}", verbose_level=1)
-
-        # delete temp package
-        if tmp_pkg_path:
-            self.output(
-                f"Removing temporary file {tmp_pkg_path}",
-                verbose_level=2,
-            )
-            try:
-                os.remove(tmp_pkg_path)
-            except OSError:
-                pass
+        self.output(f"v1/packages upload: {progress.summary()}", verbose_level=1)
         return r
 
     # End of function for uploading to v1/packages endpoint
     # ------------------------------------------------------------------------
     # Beginning of functions for upload to JCDS2 endpoint (not needed for 11.5+)
 
-    def check_jcds_for_pkg(self, pkg_path, pkg_name, jamf_url, token):
+    def check_jcds_for_pkg(self, pkg_path, pkg_name, jamf_url, token, pkg_sha3=None):
         """check if a package with the same name exists in the JCDS S3 bucket.
         We'll want to check the name and get the SHA3 of the file.
         If the name and SHA3 match, we can avoid uploading it again.
@@ -316,8 +1258,9 @@ class JamfPackageUploaderBase(JamfUploaderBase):
         avoid having multiples.
         """
 
-        # calculate the SHA3-512 hash of the package
-        pkg_sha3 = self.sha3sum(pkg_path)
+        # calculate the SHA3-512 hash of the package if it was not already done
+        if not pkg_sha3:
+            pkg_sha3 = self.sha3sum(pkg_path)
 
         # get the JCDS file list
         object_type = "jcds"
@@ -403,52 +1346,28 @@ class JamfPackageUploaderBase(JamfUploaderBase):
         object_type = "jcds"
         url = f"{jamf_url}/{self.api_endpoints(object_type)}/files"
 
-        count = 0
-        while True:
-            count += 1
-            self.output(
-                f"JCDS credentials attempt {count}",
-                verbose_level=2,
-            )
-
-            request = "POST"
-            r = self.curl(
-                request=request,
-                url=url,
-                token=token,
-            )
-            credentials = r.output
-
-            # check HTTP response
-            if self.status_check(r, "jcds", pkg_name, request) == "break":
-                self.output(
-                    "JCDS credentials received. Proceeding to upload the package...",
-                    verbose_level=1,
-                )
-                break
-            if count > 5:
-                self.output(
-                    "WARNING: JCDS2 credentials were not successfully received after 5 attempts"
-                )
-                self.output(
-                    f"HTTP POST Response Code: {r.status_code}",
-                    verbose_level=1,
-                )
-                raise ProcessorError(
-                    "ERROR: JCDS2 credentials were not successfully received"
-                )
-            if int(sleep_time) > 30:
-                sleep(int(sleep_time))
-            else:
-                sleep(30)
-
-            return credentials
+        request = "POST"
+        r = self.curl_with_retry(
+            "jcds",
+            pkg_name,
+            sleep_time,
+            idempotent=True,
+            request=request,
+            url=url,
+            token=token,
+        )
+        self.output(
+            "JCDS credentials received. Proceeding to upload the package...",
+            verbose_level=1,
+        )
+        return r.output
 
     def upload_to_jcds2_s3_bucket(
         self,
         pkg_path,
         pkg_name,
         credentials,
+        pkg_sha512=None,
     ):
         """
         upload the package using the jcds API endpoint
@@ -494,23 +1413,374 @@ class JamfPackageUploaderBase(JamfUploaderBase):
             aws_secret_access_key=credentials["secretAccessKey"],
             aws_session_token=credentials["sessionToken"],
         )
+        transfer_config = self.get_s3_transfer_config(os.path.getsize(pkg_path))
+
+        # large packages are uploaded in parts that are recorded in the recipe cache,
+        # so that an interrupted upload can be resumed by the next run
+        recipe_cache_dir = self.env.get("RECIPE_CACHE_DIR")
+        if (
+            recipe_cache_dir
+            and os.path.getsize(pkg_path) > transfer_config.multipart_threshold
+        ):
+            if not pkg_sha512:
+                pkg_sha512 = self.get_pkg_digests(
+                    pkg_path, ["sha512"], recipe_cache_dir
+                )["sha512"]
+            self.resumable_s3_upload(
+                s3_client,
+                pkg_path,
+                credentials["bucketName"],
+                credentials["path"] + pkg_name,
+                transfer_config,
+                os.path.join(recipe_cache_dir, f"jcds2_upload_{pkg_name}.json"),
+                pkg_sha512,
+            )
+            return
+
+        progress = self.start_transfer(pkg_path, "JCDS upload")
         try:
             s3_client.upload_file(
                 pkg_path,
                 credentials["bucketName"],
                 credentials["path"] + pkg_name,
-                Callback=ProgressPercentage(pkg_path),
+                Callback=progress,
+                Config=transfer_config,
             )
             self.output("JCDS package upload complete", verbose_level=1)
+            self.output(f"JCDS upload: {progress.summary()}", verbose_level=1)
         except ClientError as e:
             raise ProcessorError(f"Failure uploading to S3: {e}") from e
 
+    def resumable_s3_upload(
+        self,
+        s3_client,
+        pkg_path,
+        bucket,
+        key,
+        transfer_config,
+        state_file,
+        pkg_sha512,
+        extra_args=None,
+        label="JCDS",
+    ):
+        """Upload a package to S3 in parts, recording each completed part in a state
+        file. If a previous run was interrupted while uploading the same package to the
+        same place, only the parts that S3 does not already have are uploaded."""
+        from botocore.exceptions import (  # pylint: disable=import-outside-toplevel
+            BotoCoreError,
+            ClientError,
+        )
+        from s3transfer.utils import (  # pylint: disable=import-outside-toplevel
+            signal_not_transferring,
+            signal_transferring,
+        )
+
+        file_size = os.path.getsize(pkg_path)
+        state = {}
+        try:
+            with open(state_file, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+        uploaded_parts = {}
+        if (
+            state.get("bucket") == bucket
+            and state.get("key") == key
+            and state.get("size") == file_size
+            and state.get("sha512") == pkg_sha512
+        ):
+            # check which parts S3 still has for the upload, as it may have expired
+            try:
+                paginator = s3_client.get_paginator("list_parts")
+                for page in paginator.paginate(
+                    Bucket=bucket, Key=key, UploadId=state["upload_id"]
+                ):
+                    for part in page.get("Parts", []):
+                        if part["Size"] == min(
+                            state["part_size"],
+                            file_size - (part["PartNumber"] - 1) * state["part_size"],
+                        ):
+                            uploaded_parts[part["PartNumber"]] = part["ETag"]
+            except ClientError as e:
+                self.output(
+                    f"Previous upload of {key} cannot be resumed: {e}", verbose_level=1
+                )
+                # the parts listed so far belong to the abandoned upload
+                uploaded_parts = {}
+                state = {}
+        elif state.get("upload_id"):
+            # a different package or destination, so the old upload is no use
+            self.output("Discarding a previous incomplete upload", verbose_level=1)
+            try:
+                s3_client.abort_multipart_upload(
+                    Bucket=state["bucket"],
+                    Key=state["key"],
+                    UploadId=state["upload_id"],
+                )
+            except ClientError:
+                pass
+            state = {}
+
+        if not state:
+            part_size = transfer_config.multipart_chunksize
+            try:
+                upload_id = s3_client.create_multipart_upload(
+                    Bucket=bucket, Key=key, **(extra_args or {})
+                )["UploadId"]
+            except ClientError as e:
+                raise ProcessorError(f"Failure uploading to S3: {e}") from e
+            state = {
+                "bucket": bucket,
+                "key": key,
+                "size": file_size,
+                "sha512": pkg_sha512,
+                "part_size": part_size,
+                "upload_id": upload_id,
+            }
+        part_size = state["part_size"]
+        upload_id = state["upload_id"]
+        part_count = max(-(-file_size // part_size), 1)
+        state_lock = threading.Lock()
+
+        def save_state():
+            state["parts"] = {str(n): etag for n, etag in uploaded_parts.items()}
+            tmp_state_file = f"{state_file}.tmp"
+            with open(tmp_state_file, "w", encoding="utf-8") as f:
+                json.dump(state, f)
+            os.replace(tmp_state_file, state_file)
+
+        save_state()
+        already_transferred = sum(
+            min(part_size, file_size - (n - 1) * part_size) for n in uploaded_parts
+        )
+        if uploaded_parts:
+            self.output(
+                f"Resuming upload of {key}: {len(uploaded_parts)} of {part_count} "
+                "parts already uploaded",
+                verbose_level=1,
+            )
+        progress = self.start_transfer(
+            pkg_path,
+            f"{label} upload",
+            already_transferred,
+            bandwidth_limit=transfer_config.max_bandwidth or 0,
+        )
+        # the parts tell progress when they are being sent, so that the bandwidth
+        # limit holds back the bytes sent rather than the checksums being calculated
+        s3_client.meta.events.register_first(
+            "request-created.s3",
+            signal_not_transferring,
+            unique_id="s3upload-not-transferring",
+        )
+        s3_client.meta.events.register_last(
+            "request-created.s3",
+            signal_transferring,
+            unique_id="s3upload-transferring",
+        )
+
+        def upload_part(part_number):
+            # a bandwidth schedule may move to another window during a long upload
+            if not self.env.get("s3_max_bandwidth"):
+                progress.set_bandwidth_limit(self.get_bandwidth_limit())
+            # the part is streamed from the package rather than read into memory, as
+            # the largest parts are uploaded up to 16 at a time
+            with FilePart(
+                pkg_path, (part_number - 1) * part_size, part_size, callback=progress
+            ) as body:
+                response = s3_client.upload_part(
+                    Bucket=bucket,
+                    Key=key,
+                    UploadId=upload_id,
+                    PartNumber=part_number,
+                    Body=body,
+                )
+            with state_lock:
+                uploaded_parts[part_number] = response["ETag"]
+                save_state()
+
+        remaining = [n for n in range(1, part_count + 1) if n not in uploaded_parts]
+        try:
+            with ThreadPoolExecutor(
+                max_workers=transfer_config.max_concurrency
+            ) as executor:
+                for future in [
+                    executor.submit(upload_part, part_number)
+                    for part_number in remaining
+                ]:
+                    future.result()
+            s3_client.complete_multipart_upload(
+                Bucket=bucket,
+                Key=key,
+                UploadId=upload_id,
+                MultipartUpload={
+                    "Parts": [
+                        {"PartNumber": n, "ETag": uploaded_parts[n]}
+                        for n in sorted(uploaded_parts)
+                    ]
+                },
+            )
+        except (BotoCoreError, ClientError) as e:
+            raise ProcessorError(
+                f"Failure uploading to S3: {e}. {len(uploaded_parts)} of {part_count} "
+                "parts were uploaded and will be resumed on the next run."
+            ) from e
+        os.remove(state_file)
+        self.output(f"{label} package upload complete", verbose_level=1)
+        self.output(f"{label} upload: {progress.summary()}", verbose_level=1)
+
+    def get_s3_transfer_config(self, file_size):
+        """Return the boto3 transfer settings for uploading a file of this size.
+
+        Larger files get larger parts and more concurrent part uploads. This can be
+        overridden with s3_part_size (MB), s3_max_concurrency and s3_max_bandwidth
+        (MB/s) in the environment. Without s3_max_bandwidth, the limit for package
+        transfers from pkg_bandwidth_limit or pkg_bandwidth_schedule is used.
+        """
+        from boto3.s3.transfer import (  # pylint: disable=import-outside-toplevel
+            TransferConfig,
+        )
+
+        mb = 1024 * 1024
+        if file_size < 100 * mb:
+            part_size, max_concurrency = 8 * mb, 4
+        elif file_size < 1024 * mb:
+            part_size, max_concurrency = 16 * mb, 8
+        elif file_size < 10 * 1024 * mb:
+            part_size, max_concurrency = 64 * mb, 10
+        else:
+            part_size, max_concurrency = 128 * mb, 16
+        max_bandwidth = None
+        try:
+            if self.env.get("s3_part_size"):
+                part_size = int(float(self.env.get("s3_part_size")) * mb)
+            if self.env.get("s3_max_concurrency"):
+                max_concurrency = int(self.env.get("s3_max_concurrency"))
+            if self.env.get("s3_max_bandwidth"):
+                max_bandwidth = int(float(self.env.get("s3_max_bandwidth")) * mb)
+            else:
+                max_bandwidth = self.get_bandwidth_limit() or None
+        except ValueError as e:
+            raise ProcessorError(f"Invalid S3 transfer setting: {e}") from e
+
+        # S3 allows at most 10,000 parts per upload, each at least 5 MB
+        part_size = max(part_size, -(-file_size // 10000), 5 * mb)
+        self.output(
+            f"S3 transfer settings: part size {part_size // mb} MB, "
+            f"concurrency {max_concurrency}, "
+            + (
+                f"bandwidth limit {max_bandwidth / mb:g} MB/s"
+                if max_bandwidth
+                else "no bandwidth limit"
+            ),
+            verbose_level=2,
+        )
+        return TransferConfig(
+            multipart_threshold=part_size,
+            multipart_chunksize=part_size,
+            max_concurrency=max_concurrency,
+            max_bandwidth=max_bandwidth,
+            use_threads=True,
+        )
+
     # End of function for uploading to JCDS2 endpoint
     # ------------------------------------------------------------------------
     # Beginning of function for uploading to AWS CDP (not needed for 11.5+)
 
-    def upload_to_aws_s3_bucket(self, pkg_path, pkg_name):
+    def upload_to_aws_s3_bucket(self, pkg_path, pkg_name, pkg_sha512=None):
         """upload the package to an AWS CDP
+        This uses the boto3 python module if it is installed, with the same credentials
+        and configuration as the aws-cli tools (set up with 'aws configure'). Otherwise
+        the aws-cli tools are used.
+
+        You must also specify the bucket name to the environment ('S3_BUCKET_NAME').
+
+        The upload is skipped if an object with the same name, size and checksum is
+        already in the bucket.
+        """
+        try:
+            import boto3  # pylint: disable=import-outside-toplevel
+            from botocore.exceptions import (  # pylint: disable=import-outside-toplevel
+                BotoCoreError,
+                ClientError,
+            )
+        except ImportError:
+            self.output(
+                "boto3 module not found, so using aws-cli to upload the package",
+                verbose_level=2,
+            )
+            self.upload_to_aws_s3_bucket_with_cli(pkg_path, pkg_name)
+            return
+
+        bucket = self.env.get("S3_BUCKET_NAME")
+        recipe_cache_dir = self.env.get("RECIPE_CACHE_DIR")
+        file_size = os.path.getsize(pkg_path)
+        if not pkg_sha512:
+            pkg_sha512 = self.get_pkg_digests(pkg_path, ["sha512"], recipe_cache_dir)[
+                "sha512"
+            ]
+
+        try:
+            s3_client = boto3.client("s3")
+            # check for an existing object
+            try:
+                existing = s3_client.head_object(Bucket=bucket, Key=pkg_name)
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") not in ("404", "NoSuchKey"):
+                    raise
+                existing = None
+            if existing and existing["ContentLength"] == file_size:
+                existing_sha512 = existing.get("Metadata", {}).get("sha512")
+                existing_etag = existing.get("ETag", "").strip('"')
+                # objects uploaded by aws-cli have no SHA-512 metadata, but the ETag of
+                # an object uploaded in one part is its MD5 hash
+                if existing_sha512 == pkg_sha512 or (
+                    not existing_sha512
+                    and "-" not in existing_etag
+                    and existing_etag
+                    == self.get_pkg_digests(pkg_path, ["md5"], recipe_cache_dir)["md5"]
+                ):
+                    self.output(
+                        f"Package '{pkg_name}' already exists in S3 bucket '{bucket}' "
+                        "with the same size and checksum. Not uploading it again.",
+                        verbose_level=1,
+                    )
+                    return
+
+            self.output(
+                f"Uploading {pkg_name} to S3 bucket '{bucket}'", verbose_level=1
+            )
+            transfer_config = self.get_s3_transfer_config(file_size)
+            extra_args = {"Metadata": {"sha512": pkg_sha512}}
+            if recipe_cache_dir and file_size > transfer_config.multipart_threshold:
+                self.resumable_s3_upload(
+                    s3_client,
+                    pkg_path,
+                    bucket,
+                    pkg_name,
+                    transfer_config,
+                    os.path.join(recipe_cache_dir, f"aws_cdp_upload_{pkg_name}.json"),
+                    pkg_sha512,
+                    extra_args=extra_args,
+                    label="AWS CDP",
+                )
+                return
+            progress = self.start_transfer(pkg_path, "AWS CDP upload")
+            s3_client.upload_file(
+                pkg_path,
+                bucket,
+                pkg_name,
+                ExtraArgs=extra_args,
+                Callback=progress,
+                Config=transfer_config,
+            )
+            self.output("AWS CDP package upload complete", verbose_level=1)
+            self.output(f"AWS CDP upload: {progress.summary()}", verbose_level=1)
+        except (BotoCoreError, ClientError) as e:
+            raise ProcessorError(f"Failure uploading to S3: {e}") from e
+
+    def upload_to_aws_s3_bucket_with_cli(self, pkg_path, pkg_name):
+        """upload the package to an AWS CDP using the aws-cli tools
         Note that this requires the installation of the aws-cli tools on your AutoPkg machine
         and you must set up the connection with 'aws configure'. Alternatively you can create
         the config file manually. See https://aws.amazon.com/cli/ for installation instructions.
@@ -556,6 +1826,10 @@ class JamfPackageUploaderBase(JamfUploaderBase):
         which could mess things up"""
 
         object_type = "package"
+        # use the package list fetched at the start of a batch upload if there is one
+        obj_id = self.get_cached_obj_id(jamf_url, pkg_name, object_type)
+        if obj_id is not None:
+            return str(obj_id) if obj_id else "-1"
         url = f"{jamf_url}/{self.api_endpoints(object_type)}/name/{quote(pkg_name)}"
 
         request = "GET"
@@ -575,6 +1849,47 @@ class JamfPackageUploaderBase(JamfUploaderBase):
             obj_id = "-1"
         return obj_id
 
+    def check_pkg_hash(self, pkg_name, pkg_id, jamf_url, token, legacy_mode):
+        """Return True if the hash stored on an existing package record matches the
+        package to be uploaded, so that the upload can be skipped"""
+        if legacy_mode:
+            object_type = "package"
+            url = f"{jamf_url}/{self.api_endpoints(object_type)}/id/{pkg_id}"
+            r = self.curl(request="GET", url=url, token=token)
+            if r.status_code != 200:
+                return False
+            try:
+                record = json.loads(r.output)["package"]
+            except (ValueError, KeyError):
+                return False
+            file_name = record.get("filename")
+            hash_type = record.get("hash_type")
+            hash_value = record.get("hash_value")
+        else:
+            record = self.get_api_obj_contents_from_id(
+                jamf_url, "package_v1", pkg_id, token=token
+            )
+            if not isinstance(record, dict):
+                return False
+            file_name = record.get("fileName")
+            hash_type = record.get("hashType")
+            hash_value = record.get("hashValue")
+
+        algorithm = {"MD5": "md5", "SHA_512": "sha512"}.get(hash_type)
+        if not algorithm or not hash_value or file_name != pkg_name:
+            self.output(
+                f"No {hash_type or ''} hash to compare on package record {pkg_id}",
+                verbose_level=2,
+            )
+            return False
+        same = hash_value.lower() == self.get_pkg_digest(algorithm)
+        self.output(
+            f"{hash_type} hash of package record {pkg_id} "
+            f"{'matches' if same else 'does not match'} {pkg_name}",
+            verbose_level=1,
+        )
+        return same
+
     def get_category_id(self, jamf_url, category_name, token=""):
         """Get the category ID from the name, or abort if ID not found"""
         # check for existing category
@@ -606,8 +1921,11 @@ class JamfPackageUploaderBase(JamfUploaderBase):
         sleep_time,
         pkg_id=0,
         token="",
+        include_hash=True,
     ):
-        """Update package metadata using v1/packages endpoint. Requires 11.5+"""
+        """Update package metadata using v1/packages endpoint. Requires 11.5+.
+        If include_hash is False, the hash of the package is left out of the record,
+        for when the package has not been uploaded yet."""
 
         # get category ID
         if pkg_metadata["category"]:
@@ -636,11 +1954,11 @@ class JamfPackageUploaderBase(JamfUploaderBase):
             "suppressRegistration": 0,
         }
 
-        if md5string:
+        if include_hash and md5string:
             hash_type = "MD5"
             pkg_data["hashType"] = hash_type
             pkg_data["hashValue"] = md5string
-        elif sha512string:
+        elif include_hash and sha512string:
             hash_type = "SHA_512"
             pkg_data["hashType"] = hash_type
             pkg_data["hashValue"] = sha512string
@@ -663,26 +1981,16 @@ class JamfPackageUploaderBase(JamfUploaderBase):
         else:
             url = f"{jamf_url}/{self.api_endpoints(object_type)}"
 
-        count = 0
-        while True:
-            count += 1
-            self.output(
-                f"Package metadata upload attempt {count}",
-                verbose_level=2,
-            )
-            request = "PUT" if pkg_id else "POST"
-            r = self.curl(request=request, url=url, token=token, data=pkg_json)
-            # check HTTP response
-            if self.status_check(r, "Package Metadata", pkg_name, request) == "break":
-                break
-            if count > 5:
-                self.output("Package metadata upload did not succeed after 5 attempts")
-                self.output(f"\nHTTP POST Response Code: {r.status_code}")
-                raise ProcessorError("ERROR: Package metadata upload failed ")
-            if int(sleep_time) > 30:
-                sleep(int(sleep_time))
-            else:
-                sleep(30)
+        request = "PUT" if pkg_id else "POST"
+        r = self.curl_with_retry(
+            "Package Metadata",
+            pkg_name,
+            sleep_time,
+            request=request,
+            url=url,
+            token=token,
+            data=pkg_json,
+        )
         if r.status_code == 201:
             obj = json.loads(json.dumps(r.output))
             self.output(
@@ -746,40 +2054,17 @@ class JamfPackageUploaderBase(JamfUploaderBase):
             verbose_level=2,
         )
 
-        count = 0
-        while True:
-            count += 1
-            self.output(
-                f"Package metadata upload attempt {count}",
-                verbose_level=2,
-            )
-
-            pkg_xml = self.write_temp_file(pkg_data)
-
-            request = "PUT" if pkg_id else "POST"
-            r = self.curl(
-                request=request,
-                url=url,
-                token=token,
-                data=pkg_xml,
-            )
-
-            # check HTTP response
-            if self.status_check(r, "Package metadata", pkg_name, request) == "break":
-                break
-            if count > 5:
-                self.output(
-                    "WARNING: Package metadata update did not succeed after 5 attempts"
-                )
-                self.output(
-                    f"HTTP POST Response Code: {r.status_code}",
-                    verbose_level=1,
-                )
-                raise ProcessorError("ERROR: Package metadata upload failed ")
-            if int(sleep_time) > 30:
-                sleep(int(sleep_time))
-            else:
-                sleep(30)
+        pkg_xml = self.write_temp_file(pkg_data)
+        request = "PUT" if pkg_id else "POST"
+        self.curl_with_retry(
+            "Package metadata",
+            pkg_name,
+            sleep_time,
+            request=request,
+            url=url,
+            token=token,
+            data=pkg_xml,
+        )
 
     # End functions for uploading pkg metadata
     # ------------------------------------------------------------------------
@@ -814,6 +2099,200 @@ class JamfPackageUploaderBase(JamfUploaderBase):
 
     # End functions for recalulating packages on JCDS
     # ------------------------------------------------------------------------
+    # Beginning of functions for batch uploads
+
+    def get_batch_packages(self, pkg_batch):
+        """Return the list of packages to upload from pkg_batch. This is either a
+        directory, in which case every package in it is uploaded with the metadata of
+        the recipe, or a JSON or plist manifest containing a list of dictionaries. Each
+        dictionary must contain pkg_path, and can contain any other input of this
+        processor, such as pkg_category or pkg_info, to apply to that package."""
+        if os.path.isdir(pkg_batch) and not pkg_batch.endswith((".pkg", ".mpkg")):
+            names = sorted(os.listdir(pkg_batch))
+            return [
+                {"pkg_path": os.path.join(pkg_batch, name)}
+                for name in names
+                if name.lower().endswith(BATCH_PKG_EXTENSIONS)
+                # skip zips of bundle packages that are in the same directory
+                and not (name.endswith(".zip") and name[:-4] in names)
+            ]
+        try:
+            with open(pkg_batch, "rb") as f:
+                data = f.read()
+        except OSError as e:
+            raise ProcessorError(f"ERROR: could not read {pkg_batch}: {e}") from e
+        try:
+            packages = json.loads(data)
+        except ValueError:
+            try:
+                packages = plistlib.loads(data)
+            except plistlib.InvalidFileException as e:
+                raise ProcessorError(
+                    f"ERROR: {pkg_batch} is not a JSON or plist list of packages"
+                ) from e
+        if not isinstance(packages, list) or not all(
+            isinstance(package, dict) and package.get("pkg_path")
+            for package in packages
+        ):
+            raise ProcessorError(
+                f"ERROR: {pkg_batch} must contain a list of dictionaries, "
+                "each with a pkg_path"
+            )
+        # paths in the manifest are relative to the manifest
+        for package in packages:
+            package["pkg_path"] = os.path.join(
+                os.path.dirname(os.path.abspath(pkg_batch)), package["pkg_path"]
+            )
+        return packages
+
+    def upload_batch_package(self, package):
+        """Upload one package of a batch with its own processor, using a copy of this
+        processor's environment. Returns a dictionary with the result of the upload."""
+        env = {
+            key: value for key, value in self.env.items() if key not in BATCH_PKG_KEYS
+        }
+        env.update(package)
+        # the packages are recalculated once when the whole batch has been uploaded
+        env["defer_recalculation"] = True
+        result = {"pkg_path": package["pkg_path"], "pkg_name": "", "error": ""}
+        start = monotonic()
+        processor = self.__class__(env=env)
+        try:
+            processor.execute()
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            # any failure is recorded against the package, so that the rest of the
+            # batch is still uploaded and reported
+            self.output(f"ERROR: upload of {package['pkg_path']} failed: {e}")
+            result["error"] = str(e) or type(e).__name__
+        result["pkg_name"] = processor.env.get("pkg_name") or os.path.basename(
+            package["pkg_path"]
+        )
+        result["pkg_uploaded"] = bool(processor.env.get("pkg_uploaded"))
+        result["pkg_metadata_updated"] = bool(processor.env.get("pkg_metadata_updated"))
+        result["transfers"] = processor.env.get("jamfpackageuploader_transfers", [])
+        result["seconds"] = monotonic() - start
+        return result
+
+    def execute_batch(self, pkg_batch):
+        """Upload all the packages in pkg_batch. The token, the Jamf Pro version and a
+        single listing of the existing packages are obtained once and shared by all the
+        uploads, which are run pkg_batch_max_workers at a time."""
+        jamf_url = self.env.get("JSS_URL").rstrip("/")
+        jamf_user = self.env.get("API_USERNAME")
+        jamf_password = self.env.get("API_PASSWORD")
+        client_id = self.env.get("CLIENT_ID")
+        client_secret = self.env.get("CLIENT_SECRET")
+        max_workers = self.env.get("pkg_batch_max_workers")
+        try:
+            max_workers = max(1, int(max_workers or 4))
+        except ValueError as e:
+            raise ProcessorError(
+                f"pkg_batch_max_workers must be a number, not {max_workers}"
+            ) from e
+
+        # clear any pre-existing summary result
+        if "jamfpackageuploader_summary_result" in self.env:
+            del self.env["jamfpackageuploader_summary_result"]
+
+        packages = self.get_batch_packages(pkg_batch)
+        self.output(f"Uploading {len(packages)} packages from {pkg_batch}")
+        if not packages:
+            return
+
+        # get a token that is passed on to each upload through jamfupload_token_file
+        if jamf_url and client_id and client_secret:
+            token = self.handle_oauth(jamf_url, client_id, client_secret)
+        elif jamf_url and jamf_user and jamf_password:
+            token = self.handle_api_auth(jamf_url, jamf_user, jamf_password)
+        else:
+            raise ProcessorError(
+                "ERROR: Valid credentials not supplied (note that API Clients cannot "
+                "be used on Jamf Pro versions older than 11.5)"
+            )
+
+        # look up all the existing packages at once, so that each upload finds its
+        # package in the cache rather than asking the server
+        jamf_pro_version = self.get_jamf_pro_version(jamf_url, token)
+        if APLooseVersion(jamf_pro_version) < APLooseVersion("11.5"):
+            object_type, filter_name = "package", "name"
+        else:
+            object_type, filter_name = "package_v1", "packageName"
+        existing_packages = self.get_all_api_objects(jamf_url, object_type, token)
+        self.cache_obj_ids(
+            jamf_url,
+            object_type,
+            filter_name,
+            {str(package[filter_name]): package["id"] for package in existing_packages},
+            complete=True,
+        )
+        self.output(
+            f"Found {len(existing_packages)} existing packages on {jamf_url}",
+            verbose_level=1,
+        )
+
+        # mounting and unmounting the same share from several uploads at once would
+        # interfere, so uploads to mounted file shares are made one at a time
+        smb_urls = [
+            value
+            for key, value in self.env.items()
+            if key.startswith("SMB") and key.endswith("_URL")
+        ] + [share.get("SMB_URL") for share in self.env.get("SMB_SHARES") or []]
+        if max_workers > 1 and any("smb://" in str(url) for url in smb_urls):
+            self.output(
+                "Uploading one package at a time as File Share DPs must be mounted",
+                verbose_level=1,
+            )
+            max_workers = 1
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(self.upload_batch_package, packages))
+
+        # send a single recalculation request for all the packages, unless it is to be
+        # deferred until the end of the run
+        defer_recalculation = self.env.get("defer_recalculation")
+        if not defer_recalculation or defer_recalculation == "False":
+            run_deferred_recalculations()
+
+        self.output("Batch upload summary:")
+        for result in results:
+            if result["error"]:
+                outcome = f"failed ({result['error']})"
+            elif result["pkg_uploaded"]:
+                outcome = "uploaded"
+            elif result["pkg_metadata_updated"]:
+                outcome = "metadata updated"
+            else:
+                outcome = "unchanged"
+            self.output(
+                f"  {result['pkg_name']}: {outcome} in {result['seconds']:.1f}s"
+            )
+
+        self.env["jamfpackageuploader_batch_results"] = results
+        uploaded = [
+            result["pkg_name"]
+            for result in results
+            if not result["error"]
+            and (result["pkg_uploaded"] or result["pkg_metadata_updated"])
+        ]
+        if uploaded:
+            self.env["jamfpackageuploader_summary_result"] = {
+                "summary_text": "The following packages were uploaded to or updated in Jamf Pro:",
+                "report_fields": ["pkg_batch", "pkg_names", "count"],
+                "data": {
+                    "pkg_batch": pkg_batch,
+                    "pkg_names": ", ".join(uploaded),
+                    "count": str(len(uploaded)),
+                },
+            }
+        failed = [result["pkg_path"] for result in results if result["error"]]
+        if failed:
+            raise ProcessorError(
+                f"ERROR: {len(failed)} of {len(results)} packages could not be "
+                f"uploaded: {', '.join(failed)}"
+            )
+
+    # End of functions for batch uploads
+    # ------------------------------------------------------------------------
 
     # ------------------------------------------------------------------------
     # MAIN FUNCTION
@@ -822,6 +2301,12 @@ class JamfPackageUploaderBase(JamfUploaderBase):
     ):  # pylint: disable=too-many-branches, too-many-locals, too-many-statements
         """Perform the package upload"""
 
+        # upload a directory or manifest of packages if pkg_batch is set
+        pkg_batch = self.env.get("pkg_batch")
+        if pkg_batch:
+            self.execute_batch(pkg_batch)
+            return
+
         pkg_path = self.env.get("pkg_path")
         if not pkg_path:
             try:
@@ -840,6 +2325,7 @@ class JamfPackageUploaderBase(JamfUploaderBase):
         jcds2_mode = self.env.get("jcds2_mode")
         aws_cdp_mode = self.env.get("aws_cdp_mode")
         recalculate = self.env.get("recalculate")
+        defer_recalculation = self.env.get("defer_recalculation")
         use_md5 = self.env.get("md5")
         jamf_url = self.env.get("JSS_URL").rstrip("/")
         jamf_user = self.env.get("API_USERNAME")
@@ -848,8 +2334,10 @@ class JamfPackageUploaderBase(JamfUploaderBase):
         client_secret = self.env.get("CLIENT_SECRET")
         cloud_dp = self.env.get("CLOUD_DP")
         recipe_cache_dir = self.env.get("RECIPE_CACHE_DIR")
+        compare_pkg_hash = self.env.get("compare_pkg_hash")
         pkg_uploaded = False
         pkg_metadata_updated = False
+        pkg_unchanged = False
 
         # handle setting true/false variables in overrides
         if not replace or replace == "False":
@@ -864,8 +2352,14 @@ class JamfPackageUploaderBase(JamfUploaderBase):
             aws_cdp_mode = False
         if not recalculate or recalculate == "False":
             recalculate = False
+        if not defer_recalculation or defer_recalculation == "False":
+            defer_recalculation = False
         if not cloud_dp or cloud_dp == "False":
             cloud_dp = False
+        if compare_pkg_hash == "False" or compare_pkg_hash is False:
+            compare_pkg_hash = False
+        else:
+            compare_pkg_hash = True
 
         # set pkg_name if not separately defined
         if not pkg_name:
@@ -978,14 +2472,19 @@ class JamfPackageUploaderBase(JamfUploaderBase):
         if not pkg_display_name:
             pkg_display_name = pkg_name
 
-        # calculate the SHA-512 hash of the package
-        sha512string = self.sha512sum(pkg_path)
-
-        # calculate the SHA-256 hash of the package
-        # sha256string = self.sha256sum(pkg_path)
-
-        # calculate the SHA-512 hash of the package
-        md5string = self.md5sum(pkg_path) if use_md5 else None
+        # work out all the hashes of the package that we need in one read: SHA-512 for
+        # the package metadata, MD5 if requested, and SHA3-512 to compare with the JCDS.
+        # Unless the package is first copied to a file share, in which case the hashes
+        # are calculated during the copy, they are calculated in the background while
+        # we talk to the Jamf Pro server
+        hash_algorithms = ["sha512"]
+        if use_md5:
+            hash_algorithms.append("md5")
+        if jcds2_mode and (cloud_dp or not smb_shares):
+            hash_algorithms.append("sha3_512")
+        self.start_pkg_digests(
+            pkg_path, hash_algorithms, recipe_cache_dir, background=not smb_shares
+        )
 
         # now start the process of uploading the package
         self.output(f"Checking for existing package '{pkg_name}' on {jamf_url}")
@@ -1042,50 +2541,43 @@ class JamfPackageUploaderBase(JamfUploaderBase):
         self.output(
             "Number of File Share DPs: " + str(len(smb_shares)), verbose_level=2
         )
-        for smb_share in smb_shares:
-            smb_url, smb_user, smb_password = smb_share[0], smb_share[1], smb_share[2]
-            self.output(f"Begin upload to File Share DP {smb_url}", verbose_level=1)
-            if "smb://" in smb_url:
-                # mount the share
-                self.mount_smb(smb_url, smb_user, smb_password)
-            # check for existing package
-            local_pkg = self.check_local_pkg(smb_url, pkg_name)
-            if not local_pkg or replace:
-                if replace:
-                    self.output(
-                        "Replacing existing package as 'replace_pkg' is set to True",
-                        verbose_level=1,
-                    )
-                # copy the file
-                self.copy_pkg(smb_url, pkg_path, pkg_name)
-                if "smb://" in smb_url:
-                    # unmount the share
-                    self.umount_smb(smb_url)
-                # Don't set this property if
-                # 1. We need to upload to the cloud (cloud_dp == True)
-                # 2. We have more SMB shares to process
-                if not cloud_dp and (len(smb_shares) - 1) == smb_shares.index(
-                    smb_share
-                ):
-                    pkg_uploaded = True
-            else:
-                self.output(
-                    f"Not replacing existing {pkg_name} as 'replace_pkg' is set to "
-                    f"{replace}. Use replace_pkg='True' to enforce."
-                )
-                if "smb://" in smb_url:
-                    # unmount the share
-                    self.umount_smb(smb_url)
-                if smb_shares and not replace_metadata:
-                    # even if we don't upload a package, we still need to pass it on so that a
-                    # subsequent processor can use it
-                    self.env["pkg_name"] = pkg_name
-                    pkg_uploaded = False
+        if smb_shares:
+            smb_results = self.upload_to_smb_shares(
+                smb_shares, pkg_path, pkg_name, replace
+            )
+            # Don't set this property if we need to upload to the cloud (cloud_dp == True)
+            if not cloud_dp and smb_results[-1]["result"] == "copied":
+                pkg_uploaded = True
+            if (
+                any(result["result"] == "skipped" for result in smb_results)
+                and not replace_metadata
+            ):
+                # even if we don't upload a package, we still need to pass it on so that a
+                # subsequent processor can use it
+                self.env["pkg_name"] = pkg_name
 
         # otherwise process for cloud DP
         if cloud_dp or not smb_shares:
             self.output("Handling Cloud Distribution Point", verbose_level=2)
-            if not pkg_id or replace:
+            # jcds2_mode and aws_cdp_mode compare the package with the copy in the
+            # cloud instead, so the package record is only checked for the other modes
+            if (
+                pkg_id
+                and replace
+                and compare_pkg_hash
+                and not jcds2_mode
+                and not aws_cdp_mode
+            ):
+                pkg_unchanged = self.check_pkg_hash(
+                    pkg_name, pkg_id, jamf_url, token, legacy_mode
+                )
+            if pkg_unchanged:
+                self.output(
+                    f"Not uploading {pkg_name} as it matches the hash of the existing "
+                    "package. Use compare_pkg_hash='False' to enforce.",
+                    verbose_level=1,
+                )
+            elif not pkg_id or replace:
                 if replace:
                     self.output(
                         "Replacing existing package as 'replace_pkg' is set to True",
@@ -1102,6 +2594,7 @@ class JamfPackageUploaderBase(JamfUploaderBase):
                         pkg_name,
                         jamf_url,
                         token=token,
+                        pkg_sha3=self.get_pkg_digest("sha3_512"),
                     )
 
                     # if package doesn't match, we need to delete the one in the JCDS
@@ -1141,6 +2634,7 @@ class JamfPackageUploaderBase(JamfUploaderBase):
                             pkg_path,
                             pkg_name,
                             credentials,
+                            pkg_sha512=self.get_pkg_digest("sha512"),
                         )
 
                     # fake that the package was replaced even if it wasn't
@@ -1148,8 +2642,10 @@ class JamfPackageUploaderBase(JamfUploaderBase):
                     pkg_uploaded = True
 
                 elif aws_cdp_mode:
-                    # upload the package - this uses sync so we don't need to check if it's changed
-                    self.upload_to_aws_s3_bucket(pkg_path, pkg_name)
+                    # upload the package - this is skipped if it has not changed
+                    self.upload_to_aws_s3_bucket(
+                        pkg_path, pkg_name, pkg_sha512=self.get_pkg_digest("sha512")
+                    )
 
                     # fake that the package was replaced even if it wasn't
                     # so that the metadata gets replaced
@@ -1213,6 +2709,22 @@ class JamfPackageUploaderBase(JamfUploaderBase):
             else:
                 raise ProcessorError("ERROR: Valid credentials not supplied")
 
+        # the hashes of the package are needed for the metadata
+        sha512string = self.get_pkg_digest("sha512")
+        md5string = self.get_pkg_digest("md5") if use_md5 else None
+
+        # with the v1/packages endpoint the package is uploaded after its metadata, so
+        # the hash is only written to the record once the upload has succeeded.
+        # Otherwise a failed upload would leave a record whose hash matches the new
+        # package but not the file, and compare_pkg_hash would skip the next upload
+        upload_after_metadata = (
+            not jcds2_mode
+            and not aws_cdp_mode
+            and not legacy_mode
+            and (not smb_shares or cloud_dp)
+            and not pkg_unchanged
+        )
+
         # now process the package metadata
         if (
             int(pkg_id) > 0
@@ -1247,6 +2759,7 @@ class JamfPackageUploaderBase(JamfUploaderBase):
                     sleep_time,
                     pkg_id=pkg_id,
                     token=token,
+                    include_hash=not upload_after_metadata,
                 )
             pkg_metadata_updated = True
         elif int(pkg_id) <= 0 and (
@@ -1270,6 +2783,7 @@ class JamfPackageUploaderBase(JamfUploaderBase):
                     sleep_time,
                     pkg_id=pkg_id,
                     token=token,
+                    include_hash=not upload_after_metadata,
                 )
             else:
                 self.update_pkg_metadata(
@@ -1299,6 +2813,7 @@ class JamfPackageUploaderBase(JamfUploaderBase):
             and not legacy_mode
             and (not smb_shares or cloud_dp)
             and pkg_metadata_updated
+            and not pkg_unchanged
         ):
             self.output(f"ID: {obj_id}", verbose_level=3)  # TEMP
             if obj_id != "-1":
@@ -1317,12 +2832,43 @@ class JamfPackageUploaderBase(JamfUploaderBase):
             # if we get this far then there was a 200 success response so the package was uploaded
             pkg_uploaded = True
 
+            # check token again as the package upload may have taken some time, then
+            # add the hash of the uploaded package to its record
+            if client_id and client_secret:
+                token = self.handle_oauth(jamf_url, client_id, client_secret)
+            elif jamf_user and jamf_password:
+                token = self.handle_api_auth(jamf_url, jamf_user, jamf_password)
+            self.output(
+                f"Adding the hash of the uploaded package to package record {pkg_id}",
+                verbose_level=1,
+            )
+            self.update_pkg_metadata_api(
+                jamf_url,
+                pkg_name,
+                pkg_display_name,
+                pkg_metadata,
+                sha512string,
+                md5string,
+                sleep_time,
+                pkg_id=pkg_id,
+                token=token,
+            )
+
         # recalculate packages on JCDS if the metadata was updated and recalculation requested
         # Jamf Pro 11.10+ only
         if (
             APLooseVersion(jamf_pro_version) >= APLooseVersion("11.10")
             and pkg_metadata_updated
             and recalculate
+            and defer_recalculation
+        ):
+            # send one request for all the packages uploaded during the run
+            self.defer_recalculation(jamf_url)
+            packages_recalculated = "deferred"
+        elif (
+            APLooseVersion(jamf_pro_version) >= APLooseVersion("11.10")
+            and pkg_metadata_updated
+            and recalculate
         ):
             # check token again using oauth or basic auth depending on the credentials given
             # as package upload may have taken some time
@@ -1343,6 +2889,8 @@ class JamfPackageUploaderBase(JamfUploaderBase):
         self.env["pkg_display_name"] = pkg_display_name
         self.env["pkg_uploaded"] = pkg_uploaded
         self.env["pkg_metadata_updated"] = pkg_metadata_updated
+        transfers = [progress.record() for progress in getattr(self, "transfers", [])]
+        self.env["jamfpackageuploader_transfers"] = transfers
         if pkg_metadata_updated or pkg_uploaded:
             self.env["jamfpackageuploader_summary_result"] = {
                 "summary_text": "The following packages were uploaded to or updated in Jamf Pro:",
@@ -1354,6 +2902,7 @@ class JamfPackageUploaderBase(JamfUploaderBase):
                     "pkg_path",
                     "version",
                     "packages_recalculated",
+                    "transfers",
                 ],
                 "data": {
                     "category": pkg_category,
@@ -1363,5 +2912,11 @@ class JamfPackageUploaderBase(JamfUploaderBase):
                     "pkg_path": pkg_path,
                     "version": version,
                     "packages_recalculated": str(packages_recalculated),
+                    "transfers": "; ".join(
+                        f"{t['transfer']}: {t['transferred_bytes'] / 1000000:.1f} MB "
+                        f"in {t['seconds']:.1f}s ({t['mb_per_second']:.1f} MB/s, "
+                        f"{t['retries']} retries)"
+                        for t in transfers
+                    ),
                 },
             }
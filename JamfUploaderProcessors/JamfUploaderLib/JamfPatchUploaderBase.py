@@ -25,8 +25,6 @@ import sys
 
 import xml.etree.ElementTree as ET
 
-from time import sleep
-
 from autopkglib import (  # pylint: disable=import-error
     ProcessorError,
 )
@@ -80,15 +78,9 @@ class JamfPatchUploaderBase(JamfUploaderBase):
         """Uploads an updated patch softwaretitle including the linked pkg"""
         self.output("Linking pkg versions in patch softwaretitle...")
 
-        # Get package id from jamf. Try it three times, since
-        # in some cases a recently uploaded package can not be found.
-        count = 0
-        while True:
-            count += 1
-            self.output(
-                f"Attempt '{count}' of fetching package id of '{pkg_name}'.",
-                verbose_level=2,
-            )
+        # Get package id from jamf, waiting for it if necessary, since
+        # in some cases a recently uploaded package can not be found straight away.
+        def find_pkg_id():
             obj_type = "package"
             obj_name = pkg_name
             pkg_id = self.get_api_obj_id_from_name(
@@ -97,14 +89,19 @@ class JamfPatchUploaderBase(JamfUploaderBase):
                 obj_type,
                 token=token,
             )
-            if pkg_id:
-                self.output(f"Found id '{pkg_id}' for package '{pkg_name}'.")
-                break
-            if count > 3:
-                raise ProcessorError(
-                    f"ERROR: Couldn't fetch package id for package '{pkg_name}'."
-                )
-            sleep(10)
+            if not pkg_id:
+                # the package list may have been cached before the package appeared
+                self.forget_cached_obj_ids(jamf_url, obj_type)
+                return None
+            return pkg_id
+
+        try:
+            pkg_id = self.wait_until_visible(f"Package '{pkg_name}'", find_pkg_id)
+        except ProcessorError as e:
+            raise ProcessorError(
+                f"ERROR: Couldn't fetch package id for package '{pkg_name}'."
+            ) from e
+        self.output(f"Found id '{pkg_id}' for package '{pkg_name}'.")
 
         # Get current softwaretitle
         object_type = "patch_software_title"
@@ -164,33 +161,15 @@ class JamfPatchUploaderBase(JamfUploaderBase):
         patch_softwaretitle_xml_file = self.write_xml_file(patch_softwaretitle_xml)
 
         # Upload the 'updated' patch softwaretitle
-        count = 0
-        while True:
-            count += 1
-            self.output(f"Patch Softwaretitle upload attempt {count}.", verbose_level=2)
-            r = self.curl(
-                request="PUT",
-                url=url,  # Unchanged url from the request earlier
-                token=token,
-                data=patch_softwaretitle_xml_file,
-            )
-            # Check HTTP Status
-            if (
-                self.status_check(
-                    r, "Patch Softwaretitle", patch_softwaretitle_name, "PUT"
-                )
-                == "break"
-            ):
-                break
-            if count > 5:
-                self.output(
-                    "ERROR: Uploading updated Patch Softwaretitle did not succeed after 5 attempts."
-                )
-                raise ProcessorError("ERROR: Patch Softwaretitle upload failed.")
-            if int(sleep_time) > 30:
-                sleep(int(sleep_time))
-            else:
-                sleep(30)
+        self.curl_with_retry(
+            "Patch Softwaretitle",
+            patch_softwaretitle_name,
+            sleep_time,
+            request="PUT",
+            url=url,  # Unchanged url from the request earlier
+            token=token,
+            data=patch_softwaretitle_xml_file,
+        )
 
     def upload_patch(
         self,
@@ -215,30 +194,16 @@ class JamfPatchUploaderBase(JamfUploaderBase):
                 f"/id/{patch_softwaretitle_id}"
             )
 
-        count = 0
-        while True:
-            count += 1
-            self.output(f"Patch upload attempt {count}", verbose_level=2)
-            request = "PUT" if patch_id else "POST"
-            r = self.curl(
-                request=request,
-                url=url,
-                token=token,
-                data=patch_template,
-            )
-            # check HTTP response
-            if self.status_check(r, "Patch", patch_name, request) == "break":
-                break
-            if count > 5:
-                self.output(
-                    "WARNING: Patch policy upload did not succeed after 5 attempts"
-                )
-                self.output(f"\nHTTP POST Response Code: {r.status_code}")
-                raise ProcessorError("ERROR: Policy upload failed.")
-            if int(sleep_time) > 30:
-                sleep(int(sleep_time))
-            else:
-                sleep(30)
+        request = "PUT" if patch_id else "POST"
+        r = self.curl_with_retry(
+            "Patch",
+            patch_name,
+            sleep_time,
+            request=request,
+            url=url,
+            token=token,
+            data=patch_template,
+        )
         return r
 
     def execute(self):
@@ -27,7 +27,6 @@ import json
 import os.path
 import sys
 
-from time import sleep
 from urllib.parse import quote
 
 from autopkglib import ProcessorError, APLooseVersion  # pylint: disable=import-error
@@ -147,26 +146,16 @@ class JamfPkgMetadataUploaderBase(JamfUploaderBase):
         else:
             url = f"{jamf_url}/{self.api_endpoints(object_type)}"
 
-        count = 0
-        while True:
-            count += 1
-            self.output(
-                f"Package metadata upload attempt {count}",
-                verbose_level=2,
-            )
-            request = "PUT" if pkg_id else "POST"
-            r = self.curl(request=request, url=url, token=token, data=pkg_json)
-            # check HTTP response
-            if self.status_check(r, "Package Metadata", pkg_name, request) == "break":
-                break
-            if count > 5:
-                self.output("Package metadata upload did not succeed after 5 attempts")
-                self.output(f"\nHTTP POST Response Code: {r.status_code}")
-                raise ProcessorError("ERROR: Package metadata upload failed ")
-            if int(sleep_time) > 30:
-                sleep(int(sleep_time))
-            else:
-                sleep(30)
+        request = "PUT" if pkg_id else "POST"
+        r = self.curl_with_retry(
+            "Package Metadata",
+            pkg_name,
+            sleep_time,
+            request=request,
+            url=url,
+            token=token,
+            data=pkg_json,
+        )
         if r.status_code == 201:
             obj = json.loads(json.dumps(r.output))
             self.output(
@@ -20,8 +20,6 @@ limitations under the License.
 import os.path
 import sys
 
-from time import sleep
-
 from autopkglib import (  # pylint: disable=import-error
     ProcessorError,
 )
@@ -47,21 +45,14 @@ class JamfPolicyDeleterBase(JamfUploaderBase):
         object_type = "policy"
         url = f"{jamf_url}/{self.api_endpoints(object_type)}/id/{obj_id}"
 
-        count = 0
-        while True:
-            count += 1
-            self.output(f"Policy delete attempt {count}", verbose_level=2)
-            request = "DELETE"
-            r = self.curl(request=request, url=url, token=token)
-
-            # check HTTP response
-            if self.status_check(r, "Policy", obj_id, request) == "break":
-                break
-            if count > 5:
-                self.output("WARNING: Policy deletion did not succeed after 5 attempts")
-                self.output(f"\nHTTP POST Response Code: {r.status_code}")
-                raise ProcessorError("ERROR: Policy deletion failed ")
-            sleep(30)
+        request = "DELETE"
+        r = self.curl_with_retry(
+            "Policy",
+            obj_id,
+            request=request,
+            url=url,
+            token=token,
+        )
         return r
 
     def execute(self):
@@ -20,7 +20,6 @@ limitations under the License.
 import os.path
 import sys
 
-from time import sleep
 from urllib.parse import quote
 
 from autopkglib import (  # pylint: disable=import-error
@@ -48,30 +47,15 @@ class JamfPolicyLogFlusherBase(JamfUploaderBase):
         object_type = "logflush"
         url = f"{jamf_url}/{self.api_endpoints(object_type)}/policy/id/{obj_id}/interval/{quote(interval)}"
 
-        count = 0
-        while True:
-            count += 1
-            self.output(f"Log Flush Request attempt {count}", verbose_level=2)
-            request = "DELETE"
-            r = self.curl(
-                request=request,
-                url=url,
-                token=token,
-            )
-
-            # check HTTP response
-            if self.status_check(r, "Log Flush Request", obj_id, request) == "break":
-                break
-            if count > 5:
-                self.output(
-                    "WARNING: Log Flush Request did not succeed after 5 attempts"
-                )
-                self.output(f"\nHTTP POST Response Code: {r.status_code}")
-                raise ProcessorError("ERROR: Log Flush Request failed")
-            if int(sleep_time) > 30:
-                sleep(int(sleep_time))
-            else:
-                sleep(30)
+        request = "DELETE"
+        r = self.curl_with_retry(
+            "Log Flush Request",
+            obj_id,
+            sleep_time,
+            request=request,
+            url=url,
+            token=token,
+        )
         return r
 
     def execute(self):
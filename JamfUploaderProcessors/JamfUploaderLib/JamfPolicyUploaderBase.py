@@ -21,8 +21,6 @@ import os.path
 import sys
 import xml.etree.ElementTree as ElementTree
 
-from time import sleep
-
 from autopkglib import (  # pylint: disable=import-error
     ProcessorError,
 )
@@ -90,28 +88,16 @@ class JamfPolicyUploaderBase(JamfUploaderBase):
         object_type = "policy"
         url = f"{jamf_url}/{self.api_endpoints(object_type)}/id/{obj_id}"
 
-        count = 0
-        while True:
-            count += 1
-            self.output(f"Policy upload attempt {count}", verbose_level=2)
-            request = "PUT" if obj_id else "POST"
-            r = self.curl(
-                request=request,
-                url=url,
-                token=token,
-                data=template_xml,
-            )
-            # check HTTP response
-            if self.status_check(r, "Policy", policy_name, request) == "break":
-                break
-            if count > 5:
-                self.output("WARNING: Policy upload did not succeed after 5 attempts")
-                self.output(f"\nHTTP POST Response Code: {r.status_code}")
-                raise ProcessorError("ERROR: Policy upload failed ")
-            if int(sleep_time) > 30:
-                sleep(int(sleep_time))
-            else:
-                sleep(30)
+        request = "PUT" if obj_id else "POST"
+        r = self.curl_with_retry(
+            "Policy",
+            policy_name,
+            sleep_time,
+            request=request,
+            url=url,
+            token=token,
+            data=template_xml,
+        )
         return r
 
     def upload_policy_icon(
@@ -126,26 +112,37 @@ class JamfPolicyUploaderBase(JamfUploaderBase):
     ):
         """Upload an icon to the policy that was just created"""
         # check that the policy exists.
-        # Use the obj_id if we have it, or use name if we don't have it yet
-        # We may need a wait loop here for new policies
+        # Use the obj_id if we have it, or use name if we don't have it yet.
+        # A new policy may take a moment to be returned by the API, so wait for it
         if not obj_id:
             # check for existing policy
             self.output(f"\nChecking '{policy_name}' on {jamf_url}")
             obj_type = "policy"
             obj_name = policy_name
-            obj_id = self.get_api_obj_id_from_name(
-                jamf_url,
-                obj_type,
-                obj_name,
-                token=token,
-            )
 
-            if not obj_id:
+            def find_policy_id():
+                policy_id = self.get_api_obj_id_from_name(
+                    jamf_url,
+                    obj_name,
+                    obj_type,
+                    token=token,
+                )
+                if not policy_id:
+                    self.forget_cached_obj_ids(jamf_url, obj_type)
+                    return None
+                return policy_id
+
+            try:
+                obj_id = self.wait_until_visible(
+                    f"Policy '{policy_name}'", find_policy_id
+                )
+            except ProcessorError as e:
                 raise ProcessorError(
                     f"ERROR: could not locate ID for policy '{policy_name}' so cannot upload icon"
-                )
+                ) from e
 
-        # Now grab the name of the existing icon using the API
+        # Now grab the name of the existing icon using the API. The policy has just
+        # been found, so if it cannot be read, something else is wrong
         existing_icon = self.get_classic_api_obj_value_from_id(
             jamf_url,
             "policy",
@@ -153,6 +150,11 @@ class JamfPolicyUploaderBase(JamfUploaderBase):
             "self_service/self_service_icon/filename",
             token=token,
         )
+        if existing_icon is None:
+            raise ProcessorError(
+                f"ERROR: could not read policy '{policy_name}' (ID {obj_id}) so cannot "
+                "upload icon"
+            )
         if existing_icon:
             self.output(f"Existing policy icon is '{existing_icon}'", verbose_level=1)
         # If the icon naame matches that we already have, don't upload again
@@ -167,30 +169,17 @@ class JamfPolicyUploaderBase(JamfUploaderBase):
 
             self.output("Uploading icon...")
 
-            count = 0
-            while True:
-                count += 1
-                self.output(f"Icon upload attempt {count}", verbose_level=2)
-                request = "POST"
-                r = self.curl(
-                    request=request,
-                    url=url,
-                    token=token,
-                    data=policy_icon_path,
-                    endpoint_type="policy_icon",
-                )
-
-                # check HTTP response
-                if self.status_check(r, "Icon", policy_icon_name, request) == "break":
-                    break
-                if count > 5:
-                    print("WARNING: Icon upload did not succeed after 5 attempts")
-                    print(f"\nHTTP POST Response Code: {r.status_code}")
-                    raise ProcessorError("ERROR: Icon upload failed")
-                if int(sleep_time) > 30:
-                    sleep(int(sleep_time))
-                else:
-                    sleep(30)
+            request = "POST"
+            self.curl_with_retry(
+                "Icon",
+                policy_icon_name,
+                sleep_time,
+                request=request,
+                url=url,
+                token=token,
+                data=policy_icon_path,
+                endpoint_type="policy_icon",
+            )
         else:
             self.output("Not replacing icon. Set replace_icon='True' to enforce...")
         return policy_icon_name
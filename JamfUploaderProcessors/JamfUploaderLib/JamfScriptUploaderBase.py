@@ -20,8 +20,6 @@ limitations under the License.
 import os.path
 import sys
 
-from time import sleep
-
 from autopkglib import (  # pylint: disable=import-error
     ProcessorError,
 )
@@ -120,26 +118,16 @@ class JamfScriptUploaderBase(JamfUploaderBase):
         else:
             url = f"{jamf_url}/{self.api_endpoints(object_type)}"
 
-        count = 0
-        while True:
-            count += 1
-            self.output(
-                f"Script upload attempt {count}",
-                verbose_level=2,
-            )
-            request = "PUT" if obj_id else "POST"
-            r = self.curl(request=request, url=url, token=token, data=script_json)
-            # check HTTP response
-            if self.status_check(r, "Script", script_name, request) == "break":
-                break
-            if count > 5:
-                self.output("Script upload did not succeed after 5 attempts")
-                self.output(f"\nHTTP POST Response Code: {r.status_code}")
-                raise ProcessorError("ERROR: Script upload failed ")
-            if int(sleep_time) > 30:
-                sleep(int(sleep_time))
-            else:
-                sleep(30)
+        request = "PUT" if obj_id else "POST"
+        r = self.curl_with_retry(
+            "Script",
+            script_name,
+            sleep_time,
+            request=request,
+            url=url,
+            token=token,
+            data=script_json,
+        )
         return r
 
     def execute(self):
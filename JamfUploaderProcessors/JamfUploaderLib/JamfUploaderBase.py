@@ -17,20 +17,33 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
+import asyncio
+import atexit
+import contextvars
+import fcntl
 import json
 import os
+import random
 import re
 import subprocess
 import tempfile
+import threading
 import xml.etree.ElementTree as ET
 
 from base64 import b64encode
 from collections import abc, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from datetime import datetime, timedelta, timezone
+from email.message import Message
+from email.utils import parsedate_to_datetime
 from html.parser import HTMLParser
+from http.cookiejar import CookieJar, DefaultCookiePolicy, LoadError, MozillaCookieJar
 from pathlib import Path
 from shutil import rmtree
-from urllib.parse import quote, urlparse
+from time import monotonic, sleep, time
+from urllib.parse import quote, urlencode, urlparse
+from urllib.request import Request
 from xml.sax.saxutils import escape
 
 from autopkglib import (  # pylint: disable=import-error
@@ -38,6 +51,180 @@ from autopkglib import (  # pylint: disable=import-error
     ProcessorError,
 )
 
+# pooled keep-alive clients for the native transport, keyed by scheme, host and
+# certificate verification. These are shared by all processors in the same run.
+NATIVE_CLIENTS = {}
+NATIVE_CLIENTS_LOCK = threading.Lock()
+
+# guards creation of the temporary directory and per-thread cookie jars, so that
+# concurrent requests never share header, output or cookie files
+TEMP_FILES_LOCK = threading.RLock()
+
+# the thread whose cookie jar is used by requests that worker threads send on its
+# behalf, for example the pages fetched concurrently by get_paged_api_objects
+COOKIE_JAR_THREAD = contextvars.ContextVar("cookie_jar_thread", default=None)
+
+# semaphores limiting the number of concurrent requests to each host
+HOST_SEMAPHORES = {}
+HOST_SEMAPHORES_LOCK = threading.Lock()
+
+# endpoint types used to upload packages. These requests can take a long time, so
+# they do not hold one of the max_concurrent_requests slots for their host
+UPLOAD_ENDPOINT_TYPES = ("package_upload", "package_v1")
+
+# token buckets limiting the rate of requests to each Jamf Pro host
+RATE_LIMITERS = {}
+RATE_LIMITERS_LOCK = threading.Lock()
+
+# name to ID maps of objects found on each server during the run, keyed by server URL,
+# API endpoint and the name field used for the lookup. Classic API names are stored in
+# lower case, as Classic API lookups ignore case, while Jamf Pro API names must match
+# exactly.
+OBJ_ID_CACHE = {}
+OBJ_ID_CACHE_LOCK = threading.Lock()
+
+# Jamf Pro version of each server, so that it is only requested once per run
+JAMF_PRO_VERSIONS = {}
+JAMF_PRO_VERSIONS_LOCK = threading.Lock()
+
+# servers whose JCDS package inventory is to be recalculated once at the end of the run,
+# each with the processor whose credentials are used to send the request
+DEFERRED_RECALCULATIONS = {}
+DEFERRED_RECALCULATIONS_LOCK = threading.Lock()
+
+# number of seconds before its expiry that a stored token is no longer reused, so that
+# a token is not handed out just before it expires
+TOKEN_EXPIRY_MARGIN = 60
+
+
+def close_native_clients():
+    """close any pooled connections opened by the native transport"""
+    with NATIVE_CLIENTS_LOCK:
+        for client in NATIVE_CLIENTS.values():
+            client.close()
+        NATIVE_CLIENTS.clear()
+
+
+atexit.register(close_native_clients)
+
+
+def run_deferred_recalculations():
+    """send the package recalculation requests that were deferred until the end of the
+    run, once for each server"""
+    with DEFERRED_RECALCULATIONS_LOCK:
+        pending = list(DEFERRED_RECALCULATIONS.items())
+        DEFERRED_RECALCULATIONS.clear()
+    for jamf_url, processor in pending:
+        try:
+            processor.run_deferred_recalculation(jamf_url)
+        except (ProcessorError, OSError) as e:
+            processor.output(f"WARNING: deferred recalculation failed: {e}")
+
+
+# registered after close_native_clients so that it runs first
+atexit.register(run_deferred_recalculations)
+
+# HTTP status codes that indicate a transient condition, so the request is worth retrying
+RETRYABLE_STATUS_CODES = (408, 425, 429, 500, 502, 503, 504)
+
+# HTTP status codes with which the server asks for a request to be sent again later,
+# so that it has not acted on it
+RETRY_LATER_STATUS_CODES = (429, 503)
+
+# curl exit codes for failures before the request was sent: the host could not be
+# resolved, the connection was refused, or the TLS handshake failed
+CURL_CONNECT_ERRORS = (6, 7, 35)
+
+
+class JamfTransportError(ProcessorError):
+    """A request could not be completed, for example the connection failed or timed out.
+    request_sent is False if the request cannot have reached the server."""
+
+    def __init__(self, message, request_sent=True):
+        super().__init__(message)
+        self.request_sent = request_sent
+
+
+class ProgressReader:
+    """Read-only wrapper of a file that passes the number of bytes read to a callback,
+    so that the progress of an upload of the file can be followed"""
+
+    def __init__(self, file, callback):
+        self._file = file
+        self._callback = callback
+
+    def read(self, size=-1):
+        """Read from the file and report the number of bytes read"""
+        data = self._file.read(size)
+        if data:
+            self._callback(len(data))
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+
+class TokenBucket:
+    """Allow up to `rate` requests per second, with bursts of up to `burst` requests.
+
+    If a state file is given, the bucket is kept in that file so that it is shared with
+    other AutoPkg processes, which take turns to update it under an exclusive lock.
+    """
+
+    def __init__(self, rate, burst, state_file=None):
+        self.rate = rate
+        self.burst = burst
+        self.state_file = state_file
+        self.tokens = burst
+        self.updated = monotonic()
+        self.lock = threading.Lock()
+
+    def refill(self, tokens, updated, now):
+        """Take a token if one is available. Return the new bucket state and the
+        number of seconds to wait before trying again (0 if a token was taken)"""
+        tokens = min(self.burst, tokens + max(now - updated, 0) * self.rate)
+        if tokens >= 1:
+            return tokens - 1, now, 0
+        return tokens, now, (1 - tokens) / self.rate
+
+    def take(self):
+        """Try to take a token, returning the number of seconds to wait if none is left"""
+        with self.lock:
+            if not self.state_file:
+                self.tokens, self.updated, wait = self.refill(
+                    self.tokens, self.updated, monotonic()
+                )
+                return wait
+            with open(self.state_file, "a+", encoding="utf-8") as file:
+                fcntl.flock(file, fcntl.LOCK_EX)
+                try:
+                    file.seek(0)
+                    try:
+                        state = json.loads(file.read())
+                        tokens, updated = float(state["tokens"]), float(
+                            state["updated"]
+                        )
+                    except (ValueError, KeyError, TypeError):
+                        tokens, updated = self.burst, time()
+                    tokens, updated, wait = self.refill(tokens, updated, time())
+                    file.seek(0)
+                    file.truncate()
+                    json.dump({"tokens": tokens, "updated": updated}, file)
+                    file.flush()
+                finally:
+                    fcntl.flock(file, fcntl.LOCK_UN)
+            return wait
+
+    def acquire(self):
+        """Wait until a token is available and take it. Return the time spent waiting"""
+        waited = 0
+        while True:
+            wait = self.take()
+            if not wait:
+                return waited
+            sleep(wait)
+            waited += wait
+
 
 class JamfUploaderBase(Processor):
     """Common functions used by at least two JamfUploader processors."""
@@ -136,8 +323,15 @@ class JamfUploaderBase(Processor):
             self.env["jamfupload_token_file"] = self.init_temp_file(
                 prefix="jamf_upload_token_"
             )
-        with open(self.env["jamfupload_token_file"], "w", encoding="utf-8") as fp:
+        # write a new file and move it into place, so that processors reading the token
+        # file at the same time never see it half written
+        token_file = self.env["jamfupload_token_file"]
+        tf = self.init_temp_file(
+            prefix="jamf_upload_token_", dir_name=os.path.dirname(token_file)
+        )
+        with open(tf, "w", encoding="utf-8") as fp:
             json.dump(data, fp)
+        os.replace(tf, token_file)
 
     def write_xml_file(self, data):
         """dump some xml to a temporary file"""
@@ -155,11 +349,12 @@ class JamfUploaderBase(Processor):
 
     def make_tmp_dir(self, tmp_dir="/tmp/jamf_upload_"):
         """make the tmp directory"""
-        if not self.env.get("jamfupload_tmp_dir"):
-            base_dir, dir_name = tmp_dir.rsplit("/", 1)
-            self.env["jamfupload_tmp_dir"] = tempfile.mkdtemp(
-                prefix=dir_name, dir=base_dir
-            )
+        with TEMP_FILES_LOCK:
+            if not self.env.get("jamfupload_tmp_dir"):
+                base_dir, dir_name = tmp_dir.rsplit("/", 1)
+                self.env["jamfupload_tmp_dir"] = tempfile.mkdtemp(
+                    prefix=dir_name, dir=base_dir
+                )
         return self.env["jamfupload_tmp_dir"]
 
     def init_temp_file(
@@ -173,6 +368,29 @@ class JamfUploaderBase(Processor):
             text=text,
         )[1]
 
+    def remove_temp_files(self, *paths):
+        """remove temporary files that are no longer required"""
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def get_cookie_jar(self):
+        """Return a curl cookie jar that is unique to this processor instance and thread.
+        The session is kept for subsequent requests from the same processor, but
+        concurrent processors or threads cannot overwrite each other's cookies.
+        Worker threads of run_coroutines use the jar of the thread that started them."""
+        thread_id = COOKIE_JAR_THREAD.get() or threading.get_ident()
+        with TEMP_FILES_LOCK:
+            if not hasattr(self, "cookie_jars"):
+                self.cookie_jars = {}  # pylint: disable=attribute-defined-outside-init
+            if thread_id not in self.cookie_jars:
+                self.cookie_jars[thread_id] = self.init_temp_file(
+                    prefix="curl_cookies_", suffix=".txt"
+                )
+        return self.cookie_jars[thread_id]
+
     def get_enc_creds(self, user, password):
         """encode the username and password into a b64-encoded string"""
         credentials = f"{user}:{password}"
@@ -188,7 +406,12 @@ class JamfUploaderBase(Processor):
             token_file = ""
         if os.path.exists(token_file):
             with open(token_file, "rb") as file:
-                data = json.load(file)
+                try:
+                    data = json.load(file)
+                except ValueError:
+                    # an unreadable token file is treated as having no token
+                    self.output("Token file could not be read", verbose_level=2)
+                    data = {}
                 # check that there is a 'token' key
                 try:
                     self.output(
@@ -212,11 +435,16 @@ class JamfUploaderBase(Processor):
                                 #     self.output("Existing token is valid")
                                 #     return data["token"]
 
-                                expires_timestamp = datetime.strptime(
-                                    data["expires"], "%Y-%m-%dT%H:%M:%S.%fZ"
-                                ).timestamp()
+                                # the expiry is in UTC
+                                expires_timestamp = (
+                                    datetime.strptime(
+                                        data["expires"], "%Y-%m-%dT%H:%M:%S.%fZ"
+                                    )
+                                    .replace(tzinfo=timezone.utc)
+                                    .timestamp()
+                                )
                                 if (
-                                    expires_timestamp
+                                    expires_timestamp - TOKEN_EXPIRY_MARGIN
                                     > datetime.now(timezone.utc).timestamp()
                                 ):
                                     self.output("Existing token is valid")
@@ -270,7 +498,10 @@ class JamfUploaderBase(Processor):
                     )
                     expires = expires_str.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
 
-                    # write the data to a file
+                    # write the data to a file, in the same form as a basic auth
+                    # token so that check_api_token can reuse it
+                    output["token"] = token
+                    output["expires"] = expires
                     self.write_token_to_json_file(jamf_url, client_id, output)
                     self.output("Session token received")
                     self.output(f"Token: {token}", verbose_level=2)
@@ -364,6 +595,8 @@ class JamfUploaderBase(Processor):
         additional_curl_opts="",
         endpoint_type="",
         accept_header="",
+        upload_filename="",
+        progress=None,
     ):
         """
         Build a curl command based on request type (GET, POST, PUT, PATCH, DELETE).
@@ -384,11 +617,16 @@ class JamfUploaderBase(Processor):
         The legacy/packages endpoint uses a session ID and separate authentication token.
         This is generated by the JamfPackageUploader processor.
         Authentication for the webhooks is achieved with a preconfigured token.
+
+        For package uploads to the v1/packages endpoint, upload_filename sets the file
+        name sent to the server if it differs from the name of the file in data.
+        If progress is given, it is called with the number of bytes of the file in data
+        sent since the last call, while the file is uploaded.
         """
-        tmp_dir = self.make_tmp_dir()
-        headers_file = os.path.join(tmp_dir, "curl_headers_from_jamf_upload.txt")
+        # each request gets its own header and output files so that concurrent
+        # requests cannot overwrite each other's responses
+        headers_file = self.init_temp_file(prefix="curl_headers_", suffix=".txt")
         output_file = self.init_temp_file(prefix="jamf_upload_", suffix=".txt")
-        cookie_jar = os.path.join(tmp_dir, "curl_cookies_from_jamf_upload.txt")
 
         # build the curl command based on supplied endpoint_types
         if url:
@@ -427,7 +665,8 @@ class JamfUploaderBase(Processor):
 
         # icon download
         if endpoint_type == "icon_get":
-            output_file = os.path.join(tmp_dir, "icon_download.png")
+            self.remove_temp_files(output_file)
+            output_file = self.init_temp_file(prefix="icon_download_", suffix=".png")
 
         # 'Accept' for GET and DELETE requests
         # By default, we obtain json as its easier to parse. However,
@@ -445,7 +684,16 @@ class JamfUploaderBase(Processor):
         # icon upload (Jamf Pro API)
         elif endpoint_type == "package_v1":
             curl_cmd.extend(["--header", "Content-type: multipart/form-data"])
-            curl_cmd.extend(["--form", f"file=@{data}"])
+            if upload_filename:
+                # send the file under a different name without making a copy of it
+                quoted_filename = upload_filename.replace("\\", "\\\\").replace(
+                    '"', '\\"'
+                )
+                curl_cmd.extend(
+                    ["--form", f'file=@{data};filename="{quoted_filename}"']
+                )
+            else:
+                curl_cmd.extend(["--form", f"file=@{data}"])
 
         # icon upload (Classic API)
         elif endpoint_type == "policy_icon":
@@ -494,10 +742,11 @@ class JamfUploaderBase(Processor):
             or endpoint_type == "package_upload"
             or endpoint_type == "jcds"
         ):
+            cookie_jar = self.get_cookie_jar()
             curl_cmd.extend(["--cookie-jar", cookie_jar])
 
             # look for existing session
-            if os.path.exists(cookie_jar):
+            if os.path.getsize(cookie_jar) > 0:
                 curl_cmd.extend(["--cookie", cookie_jar])
             else:
                 self.output(
@@ -513,11 +762,43 @@ class JamfUploaderBase(Processor):
             custom_curl_opts_list = self.env.get("custom_curl_opts").split()
             curl_cmd.extend(custom_curl_opts_list)
 
-        self.output(f"curl command: {' '.join(curl_cmd)}", verbose_level=3)
-
-        # now subprocess the curl command and build the r tuple which contains the
-        # headers, status code and outputted data
-        subprocess.check_output(curl_cmd)
+        # keep under the request rate set for this server, then limit the number of
+        # requests in flight to the same host. Package uploads are not counted, so
+        # that they do not hold up other requests to the host until they finish
+        self.wait_for_rate_limit(url)
+        if endpoint_type in UPLOAD_ENDPOINT_TYPES:
+            host_slot = nullcontext()
+        else:
+            host_slot = self.get_host_semaphore(url)
+        with host_slot:
+            # send the request in-process if native_transport is set. If the request
+            # cannot be translated, we fall back to the curl binary
+            if self.native_transport_enabled():
+                r = self.native_curl(curl_cmd, url, output_file, progress)
+                if r is not None:
+                    self.remove_temp_files(headers_file)
+                    if r.output != output_file:
+                        self.remove_temp_files(output_file)
+                    self.update_obj_id_cache(url, request, r, data)
+                    return r
+
+            self.output(f"curl command: {' '.join(curl_cmd)}", verbose_level=3)
+
+            # now subprocess the curl command and build the r tuple which contains the
+            # headers, status code and outputted data
+            try:
+                if progress and data and os.path.isfile(data):
+                    self.run_curl_with_progress(
+                        curl_cmd, os.path.getsize(data), progress
+                    )
+                else:
+                    subprocess.check_output(curl_cmd)
+            except subprocess.CalledProcessError as exc:
+                self.remove_temp_files(headers_file, output_file)
+                raise JamfTransportError(
+                    f"ERROR: curl request to {url} failed (exit code {exc.returncode})",
+                    request_sent=exc.returncode not in CURL_CONNECT_ERRORS,
+                ) from exc
 
         r = namedtuple(
             "r", ["headers", "status_code", "output"], defaults=(None, None, None)
@@ -531,19 +812,441 @@ class JamfUploaderBase(Processor):
                     r.status_code = int(header.split()[1])
         except IOError as exc:
             raise ProcessorError(f"WARNING: {headers_file} not found") from exc
+        finally:
+            self.remove_temp_files(headers_file)
         if os.path.exists(output_file) and os.path.getsize(output_file) > 0:
             if "ics.services.jamfcloud.com" in url:
+                # the caller needs the downloaded file, so it is not removed here
                 r.output = output_file
             else:
-                with open(output_file, "rb") as file:
-                    if "/api/" in url or "/uapi/" in url:
-                        r.output = json.load(file)
-                    else:
-                        r.output = file.read()
+                try:
+                    with open(output_file, "rb") as file:
+                        if "/api/" in url or "/uapi/" in url:
+                            r.output = json.load(file)
+                        else:
+                            r.output = file.read()
+                finally:
+                    self.remove_temp_files(output_file)
         else:
             self.output(f"No output from request ({output_file} not found or empty)")
+            self.remove_temp_files(output_file)
+        self.update_obj_id_cache(url, request, r, data)
         return r()
 
+    def run_curl_with_progress(self, curl_cmd, size, progress):
+        """Run a curl command that uploads a file of size bytes, reading curl's progress
+        bar as it runs and passing the number of bytes sent since the last call to
+        progress. Raises CalledProcessError if curl fails, like check_output."""
+        curl_cmd = [arg for arg in curl_cmd if arg != "--silent"] + ["--progress-bar"]
+        sent = 0
+        stderr = b""
+        with subprocess.Popen(
+            curl_cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+        ) as proc:
+            for chunk in iter(lambda: proc.stderr.read1(4096), b""):
+                stderr = stderr[-4096:] + chunk
+                percentages = re.findall(rb"(\d+(?:\.\d+)?)%", chunk)
+                if percentages:
+                    now = min(int(size * float(percentages[-1]) / 100), size)
+                    if now > sent:
+                        progress(now - sent)
+                        sent = now
+        for line in re.findall(rb"curl: .*", stderr):
+            self.output(line.decode("utf-8", errors="replace"))
+        if proc.returncode:
+            raise subprocess.CalledProcessError(proc.returncode, curl_cmd)
+        if sent < size:
+            progress(size - sent)
+
+    def get_host_semaphore(self, url):
+        """Return the semaphore that limits concurrent requests to the host in the URL.
+        The limit is set with max_concurrent_requests (default 4) when the first
+        request to a host is made, and is shared by all processors in the run.
+        Package uploads are not included in the limit."""
+        host = urlparse(url).netloc
+        with HOST_SEMAPHORES_LOCK:
+            if host not in HOST_SEMAPHORES:
+                try:
+                    limit = max(int(self.env.get("max_concurrent_requests") or 4), 1)
+                except ValueError:
+                    limit = 4
+                HOST_SEMAPHORES[host] = threading.BoundedSemaphore(limit)
+        return HOST_SEMAPHORES[host]
+
+    def get_rate_limit(self, url):
+        """Return the requests per second allowed to the host in the URL, or 0 for no
+        limit. api_rate_limit is either a number, which applies to JSS_URL, or a
+        dictionary of server URLs and their limits."""
+        host = urlparse(url).netloc
+        rate_limit = self.env.get("api_rate_limit")
+        if isinstance(rate_limit, abc.Mapping):
+            rates = {
+                urlparse(key).netloc or key: value for key, value in rate_limit.items()
+            }
+            rate_limit = rates.get(host)
+        elif host != urlparse(self.env.get("JSS_URL") or "").netloc:
+            rate_limit = None
+        try:
+            return max(float(rate_limit or 0), 0)
+        except ValueError:
+            self.output(f"WARNING: invalid api_rate_limit '{rate_limit}' ignored")
+            return 0
+
+    def get_rate_limiter(self, url):
+        """Return the token bucket for the host in the URL, or None if its requests are
+        not rate limited. The bucket is created on the first request to a host and is
+        shared by all processors in the run. If api_rate_limit_shared is set, it is
+        also shared with other AutoPkg runs on this computer through a lock file."""
+        host = urlparse(url).netloc
+        with RATE_LIMITERS_LOCK:
+            if host not in RATE_LIMITERS:
+                rate = self.get_rate_limit(url)
+                if not rate:
+                    RATE_LIMITERS[host] = None
+                else:
+                    try:
+                        burst = max(float(self.env.get("api_rate_burst") or rate), 1)
+                    except ValueError:
+                        burst = max(rate, 1)
+                    state_file = None
+                    shared = self.env.get("api_rate_limit_shared")
+                    if shared and shared != "False":
+                        state_file = os.path.join(
+                            tempfile.gettempdir(),
+                            "jamf_upload_rate_"
+                            + re.sub(r"[^\w.-]", "_", host)
+                            + ".json",
+                        )
+                    self.output(
+                        f"Limiting requests to {host} to {rate} per second "
+                        f"(burst {burst:g})",
+                        verbose_level=2,
+                    )
+                    RATE_LIMITERS[host] = TokenBucket(rate, burst, state_file)
+        return RATE_LIMITERS[host]
+
+    def wait_for_rate_limit(self, url):
+        """Wait until a request to the host in the URL is allowed by its rate limit"""
+        limiter = self.get_rate_limiter(url)
+        if limiter:
+            waited = limiter.acquire()
+            if waited:
+                self.output(
+                    f"Rate limit: waited {waited:.2f} seconds before request",
+                    verbose_level=3,
+                )
+
+    async def run_in_thread(self, func, *args, **kwargs):
+        """Run a method in a worker thread. Requests that it sends use the cookie jar of
+        the thread running the event loop, so that they stay in the same session."""
+        if COOKIE_JAR_THREAD.get() is None:
+            COOKIE_JAR_THREAD.set(threading.get_ident())
+        return await asyncio.to_thread(func, *args, **kwargs)
+
+    async def async_curl(self, **kwargs):
+        """Coroutine version of curl(), which takes the same arguments.
+        Each request runs in a worker thread so that many requests can be awaited
+        together, up to the max_concurrent_requests limit for each host."""
+        return await self.run_in_thread(self.curl, **kwargs)
+
+    async def async_get_api_obj_id_from_name(
+        self, jamf_url, object_name, object_type, token, filter_name="name"
+    ):
+        """Coroutine version of get_api_obj_id_from_name()"""
+        return await self.run_in_thread(
+            self.get_api_obj_id_from_name,
+            jamf_url,
+            object_name,
+            object_type,
+            token,
+            filter_name=filter_name,
+        )
+
+    async def async_get_api_obj_contents_from_id(
+        self, jamf_url, object_type, obj_id, obj_path="", token=""
+    ):
+        """Coroutine version of get_api_obj_contents_from_id()"""
+        return await self.run_in_thread(
+            self.get_api_obj_contents_from_id,
+            jamf_url,
+            object_type,
+            obj_id,
+            obj_path=obj_path,
+            token=token,
+        )
+
+    def run_coroutines(self, *coroutines):
+        """Run coroutines concurrently from synchronous code, for example:
+
+        policy_id, group_id = self.run_coroutines(
+            self.async_get_api_obj_id_from_name(jamf_url, policy_name, "policy", token),
+            self.async_get_api_obj_id_from_name(jamf_url, group_name, "computer_group", token),
+        )
+
+        Returns a list of the results in the order the coroutines were supplied.
+        Requests sent by the coroutines use the cookie jar of the calling thread.
+        """
+        cookie_jar_thread = COOKIE_JAR_THREAD.get() or threading.get_ident()
+
+        async def gather():
+            COOKIE_JAR_THREAD.set(cookie_jar_thread)
+            return await asyncio.gather(*coroutines)
+
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(gather())
+        # asyncio.run cannot be used in a thread that is already running an event loop,
+        # so the coroutines are run in a new event loop in a separate thread
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(asyncio.run, gather()).result()
+
+    def native_transport_enabled(self):
+        """Return True if requests should be sent using the in-process transport
+        instead of a /usr/bin/curl subprocess"""
+        native_transport = self.env.get("native_transport")
+        if not native_transport or native_transport == "False":
+            return False
+        return True
+
+    def get_native_client(self, url, verify=True):
+        """Return a pooled HTTP client for the host in the supplied URL.
+        Connections are kept alive and reused by every processor in the run.
+
+        Note that this requires the httpx python module. HTTP/2 is negotiated
+        if the h2 module is also installed. To install these, run:
+
+        /usr/local/autopkg/python -m pip install 'httpx[http2]'
+        """
+        try:
+            import httpx  # pylint: disable=import-outside-toplevel
+        except ImportError:
+            self.output(
+                "WARNING: could not import httpx module, so native_transport is not "
+                "available. Use pip to install httpx and try again: "
+                "/usr/local/autopkg/python -m pip install 'httpx[http2]'",
+                verbose_level=2,
+            )
+            return None
+
+        parsed_url = urlparse(url)
+        client_key = (parsed_url.scheme, parsed_url.netloc, verify)
+        with NATIVE_CLIENTS_LOCK:
+            client = NATIVE_CLIENTS.get(client_key)
+            if client is None:
+                try:
+                    import h2  # pylint: disable=import-outside-toplevel, unused-import
+
+                    http2 = True
+                except ImportError:
+                    http2 = False
+                self.output(
+                    f"Opening connection pool for {parsed_url.netloc} (HTTP/2: {http2})",
+                    verbose_level=2,
+                )
+                # curl has no timeout by default, so only the connect phase is limited.
+                # The client is shared by all processors, so it must not keep cookies:
+                # each request carries the cookies of its own processor instead
+                client = httpx.Client(
+                    http2=http2,
+                    verify=verify,
+                    follow_redirects=True,
+                    timeout=httpx.Timeout(None, connect=30.0),
+                    cookies=CookieJar(policy=DefaultCookiePolicy(allowed_domains=[])),
+                )
+                NATIVE_CLIENTS[client_key] = client
+        return client
+
+    def native_curl(self, curl_cmd, url, output_file, progress=None):
+        """Send a request that was built for curl using a pooled in-process connection.
+
+        The curl arguments are translated so that every caller of curl() gets the same
+        request without changes. Returns the same r tuple as curl(), or None if an
+        option cannot be translated, in which case the caller should run curl instead.
+        If progress is given, it is called with the number of bytes of each block of
+        an uploaded file as it is sent.
+        """
+        request = ""
+        headers = []
+        data = None
+        upload_file = ""
+        urlencoded = []
+        forms = []
+        timeout = None
+        verify = True
+
+        # options that are handled implicitly by the native transport
+        ignored_opts = ("--location", "--silent", "--show-error")
+        ignored_opts_with_value = (
+            "--dump-header",
+            "--output",
+        )
+        cookie_file = ""
+
+        args = iter(curl_cmd[1:])
+        for arg in args:
+            if arg == url or arg in ignored_opts:
+                continue
+            if arg in ignored_opts_with_value:
+                next(args, None)
+            elif arg in ("--cookie-jar", "--cookie"):
+                cookie_file = next(args, "")
+            elif arg == "--insecure":
+                verify = False
+            elif arg == "--request":
+                request = next(args, "")
+            elif arg == "--header":
+                name, _, value = next(args, "").partition(":")
+                headers.append((name.strip(), value.strip()))
+            elif arg == "--data":
+                data = next(args, "")
+            elif arg == "--data-urlencode":
+                name, _, value = next(args, "").partition("=")
+                urlencoded.append((name, value))
+            elif arg == "--upload-file":
+                upload_file = next(args, "")
+            elif arg == "--form":
+                forms.append(next(args, ""))
+            elif arg == "--max-time":
+                timeout = float(next(args, "0"))
+            else:
+                self.output(
+                    f"curl option '{arg}' not supported by native_transport, using curl",
+                    verbose_level=2,
+                )
+                return None
+
+        client = self.get_native_client(url, verify=verify)
+        if client is None:
+            return None
+
+        # curl chooses the method from the supplied data if none is given
+        if not request:
+            if upload_file:
+                request = "PUT"
+            elif data is not None or urlencoded or forms:
+                request = "POST"
+            else:
+                request = "GET"
+
+        # build the request body
+        open_files = []
+        request_kwargs = {}
+        if forms:
+            # the multipart boundary has to be set by the client
+            headers = [h for h in headers if h[0].lower() != "content-type"]
+            files = []
+            for form in forms:
+                name, _, value = form.partition("=")
+                file_path, _, params = value.lstrip("@").partition(";")
+                # parse the type and filename parameters of a curl form field
+                form_params = {
+                    key: re.sub(r"\\(.)", r"\1", quoted[1:-1]) if quoted else plain
+                    for key, quoted, plain in re.findall(
+                        r'(\w+)=(?:("(?:[^"\\]|\\.)*")|([^;]*))', params
+                    )
+                }
+                fp = open(file_path, "rb")  # pylint: disable=consider-using-with
+                open_files.append(fp)
+                files.append(
+                    (
+                        name,
+                        (
+                            form_params.get("filename") or os.path.basename(file_path),
+                            ProgressReader(fp, progress) if progress else fp,
+                            form_params.get("type") or "application/octet-stream",
+                        ),
+                    )
+                )
+            request_kwargs["files"] = files
+        elif upload_file:
+            headers.append(("Content-Length", str(os.path.getsize(upload_file))))
+            fp = open(upload_file, "rb")  # pylint: disable=consider-using-with
+            open_files.append(fp)
+            reader = ProgressReader(fp, progress) if progress else fp
+            request_kwargs["content"] = iter(lambda: reader.read(1024 * 1024), b"")
+        elif urlencoded:
+            request_kwargs["content"] = urlencode(urlencoded)
+        elif data is not None:
+            request_kwargs["content"] = data
+        if timeout:
+            request_kwargs["timeout"] = timeout
+
+        import httpx  # pylint: disable=import-outside-toplevel
+
+        # use the same cookie jar as curl, which belongs to this processor and thread,
+        # as the pooled client is shared by all processors and keeps no cookies itself
+        cookie_jar = None
+        if cookie_file:
+            cookie_jar = MozillaCookieJar(cookie_file)
+            try:
+                cookie_jar.load(ignore_discard=True, ignore_expires=True)
+            except (OSError, LoadError):
+                pass
+            for cookie in cookie_jar:
+                if not cookie.expires:
+                    # curl writes session cookies with an expiry of 0
+                    cookie.expires, cookie.discard = None, True
+            cookie_request = Request(url, method=request or "GET")
+            cookie_jar.add_cookie_header(cookie_request)
+            if cookie_request.has_header("Cookie"):
+                headers.append(("Cookie", cookie_request.get_header("Cookie")))
+
+        self.output(f"native request: {request} {url}", verbose_level=3)
+        try:
+            response = client.request(request, url, headers=headers, **request_kwargs)
+        except httpx.HTTPError as exc:
+            raise JamfTransportError(
+                f"ERROR: request to {url} failed: {exc}",
+                request_sent=not isinstance(
+                    exc, (httpx.ConnectError, httpx.ConnectTimeout)
+                ),
+            ) from exc
+        finally:
+            for fp in open_files:
+                fp.close()
+
+        if cookie_jar is not None:
+            cookie_headers = Message()
+            for name, value in response.headers.multi_items():
+                cookie_headers[name] = value
+            cookie_jar.extract_cookies(
+                namedtuple("cookie_response", ["info"])(lambda: cookie_headers),
+                cookie_request,
+            )
+            for cookie in cookie_jar:
+                if cookie.expires is None:
+                    cookie.expires = 0
+            # concurrent requests from run_coroutines share the jar, so it is replaced
+            # in one step rather than rewritten in place
+            tf = self.init_temp_file(prefix="curl_cookies_", suffix=".txt")
+            cookie_jar.save(tf, ignore_discard=True, ignore_expires=True)
+            os.replace(tf, cookie_file)
+
+        # build the r tuple in the same shape as for curl
+        r = namedtuple(
+            "r", ["headers", "status_code", "output"], defaults=(None, None, None)
+        )
+        response_headers = [
+            f"{response.http_version} {response.status_code} {response.reason_phrase}"
+        ]
+        response_headers.extend(f"{k}: {v}" for k, v in response.headers.items())
+        output = None
+        if response.content:
+            if "ics.services.jamfcloud.com" in url:
+                with open(output_file, "wb") as file:
+                    file.write(response.content)
+                output = output_file
+            elif "/api/" in url or "/uapi/" in url:
+                output = json.loads(response.content)
+            else:
+                output = response.content
+        else:
+            self.output(f"No output from request to {url}")
+        return r(
+            headers=response_headers, status_code=response.status_code, output=output
+        )
+
     def status_check(self, r, endpoint_type, obj_name, request):
         """Return a message dependent on the HTTP response"""
         if request == "DELETE":
@@ -577,15 +1280,184 @@ class JamfUploaderBase(Processor):
                     f"status code {r.status_code}"
                 )
 
+    def is_retryable(self, r, idempotent=True, request_sent=True):
+        """Return True if a failed request is worth retrying. Transport failures (no
+        response) and transient server conditions are retried. Client errors such as
+        validation failures or access denied are not, as they would fail again.
+
+        Requests that are not idempotent, such as a POST that creates an object, are
+        only retried if the server cannot have acted on them: the request was never
+        sent, or the server asked for it to be sent again later. Otherwise a retry could
+        create a duplicate object."""
+        if r is None or r.status_code is None:
+            return idempotent or not request_sent
+        if not idempotent:
+            return r.status_code in RETRY_LATER_STATUS_CODES
+        return r.status_code in RETRYABLE_STATUS_CODES
+
+    def get_retry_after(self, r):
+        """Return the number of seconds requested by a Retry-After header, or None"""
+        if r is None or r.status_code not in (429, 503) or not r.headers:
+            return None
+        for header in r.headers:
+            name, _, value = header.partition(":")
+            if name.strip().lower() != "retry-after":
+                continue
+            value = value.strip()
+            if value.isdigit():
+                return int(value)
+            try:
+                retry_at = parsedate_to_datetime(value)
+            except (TypeError, ValueError):
+                return None
+            return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0)
+        return None
+
+    def get_retry_delay(self, attempt, r=None, sleep_time=0):
+        """Return the number of seconds to wait before the next attempt.
+        A Retry-After header from the server is honoured. Otherwise the delay grows
+        exponentially from retry_base_delay (default 2s) up to retry_max_delay
+        (default 60s), with jitter so that parallel runs do not retry in step.
+        A 'sleep' value supplied to the processor is used as the minimum delay."""
+        retry_after = self.get_retry_after(r)
+        if retry_after is not None:
+            delay = retry_after
+        else:
+            base_delay = float(self.env.get("retry_base_delay") or 2)
+            max_delay = float(self.env.get("retry_max_delay") or 60)
+            delay = min(base_delay * 2 ** (attempt - 1), max_delay)
+            delay = delay / 2 + random.uniform(0, delay / 2)
+        return max(delay, int(sleep_time or 0))
+
+    def get_retry_deadline(self):
+        """Return the time after which this processor stops retrying requests.
+        The budget is set with retry_time_budget (default 300 seconds) and is shared
+        by all the requests made by the processor."""
+        if not hasattr(self, "retry_deadline"):
+            budget = float(self.env.get("retry_time_budget") or 300)
+            self.retry_deadline = (  # pylint: disable=attribute-defined-outside-init
+                monotonic() + budget
+            )
+        return self.retry_deadline
+
+    def curl_with_retry(
+        self,
+        obj_type,
+        obj_name,
+        sleep_time=0,
+        on_retry=None,
+        idempotent=None,
+        **curl_args,
+    ):
+        """Send a request with curl() and check the response with status_check(),
+        retrying transient failures.
+
+        Failures that are not retryable raise a ProcessorError straight away. Others are
+        retried up to max_retries times (default 5) with exponential backoff, unless the
+        processor's retry_time_budget would be exceeded. on_retry is called before each
+        retry. POST requests are treated as not idempotent unless idempotent is set, so
+        that they are only retried where the server cannot have acted on them.
+        """
+        request = curl_args.get("request", "")
+        if idempotent is None:
+            idempotent = request != "POST"
+        max_retries = int(self.env.get("max_retries") or 5)
+        attempt = 0
+        while True:
+            attempt += 1
+            self.output(f"{obj_type} {request} attempt {attempt}", verbose_level=2)
+            request_sent = True
+            try:
+                r = self.curl(**curl_args)
+            except JamfTransportError as exc:
+                self.output(f"WARNING: {exc}", verbose_level=1)
+                r = None
+                request_sent = exc.request_sent
+
+            if r is not None and r.status_code is not None and r.status_code < 400:
+                self.status_check(r, obj_type, obj_name, request)
+                return r
+
+            if not self.is_retryable(r, idempotent, request_sent):
+                if r is None or r.status_code is None:
+                    raise ProcessorError(
+                        f"ERROR: {obj_type} '{obj_name}' {request} failed and was not "
+                        "retried, as the server may have received it"
+                    )
+                # this raises a ProcessorError with details of the failure
+                self.status_check(r, obj_type, obj_name, request)
+
+            delay = self.get_retry_delay(attempt, r, sleep_time)
+            if attempt > max_retries or monotonic() + delay > self.get_retry_deadline():
+                self.output(
+                    f"WARNING: {obj_type} '{obj_name}' request did not succeed "
+                    f"after {attempt} attempts"
+                )
+                if r is not None and r.status_code is not None:
+                    self.status_check(r, obj_type, obj_name, request)
+                raise ProcessorError(f"ERROR: {obj_type} '{obj_name}' request failed")
+
+            self.output(
+                f"HTTP response: {r.status_code if r is not None else 'none'}. "
+                f"Retrying in {delay:.1f} seconds",
+                verbose_level=1,
+            )
+            if on_retry:
+                on_retry()
+            sleep(delay)
+
+    def defer_recalculation(self, jamf_url):
+        """Record that the JCDS packages on a server need to be recalculated, so that
+        a single request is sent for all the packages at the end of the run, rather than
+        one for each package"""
+        with DEFERRED_RECALCULATIONS_LOCK:
+            DEFERRED_RECALCULATIONS.setdefault(jamf_url, self)
+        self.output(
+            f"Recalculation of JCDS packages on {jamf_url} deferred until the end of "
+            "the run",
+            verbose_level=1,
+        )
+
+    def run_deferred_recalculation(self, jamf_url):
+        """Send a deferred request to recalculate the JCDS packages on a server"""
+        jamf_user = self.env.get("API_USERNAME")
+        jamf_password = self.env.get("API_PASSWORD")
+        client_id = self.env.get("CLIENT_ID")
+        client_secret = self.env.get("CLIENT_SECRET")
+        if client_id and client_secret:
+            token = self.handle_oauth(jamf_url, client_id, client_secret)
+        elif jamf_user and jamf_password:
+            token = self.handle_api_auth(jamf_url, jamf_user, jamf_password)
+        else:
+            raise ProcessorError("ERROR: Valid credentials not supplied")
+
+        url = f"{jamf_url}/{self.api_endpoints('jcds')}/refresh-inventory"
+        r = self.curl(request="POST", url=url, token=token)
+        if r.status_code == 204:
+            self.output(f"JCDS Packages on {jamf_url} successfully recalculated")
+            return True
+        self.output(
+            f"WARNING: JCDS Packages on {jamf_url} NOT successfully recalculated "
+            f"(response={r.status_code})"
+        )
+        return False
+
     def get_jamf_pro_version(self, jamf_url, token):
         """get the Jamf Pro version so that we can figure out which auth method to use for the
         Classic API"""
+        with JAMF_PRO_VERSIONS_LOCK:
+            jamf_pro_version = JAMF_PRO_VERSIONS.get(jamf_url)
+        if jamf_pro_version:
+            self.output(f"Jamf Pro Version: {jamf_pro_version}")
+            return jamf_pro_version
         url = jamf_url + "/" + self.api_endpoints("jamf_pro_version")
         r = self.curl(request="GET", url=url, token=token)
         if r.status_code == 200:
             try:
                 jamf_pro_version = str(r.output["version"])
                 self.output(f"Jamf Pro Version: {jamf_pro_version}")
+                with JAMF_PRO_VERSIONS_LOCK:
+                    JAMF_PRO_VERSIONS[jamf_url] = jamf_pro_version
                 return jamf_pro_version
             except KeyError as error:
                 self.output(f"ERROR: No version of Jamf Pro received.  Error:\n{error}")
@@ -595,8 +1467,25 @@ class JamfUploaderBase(Processor):
         self, jamf_url, object_name, object_type, token, filter_name="name"
     ):
         """check if a Classic API object with the same name exists on the server"""
+        # objects already seen during this run are returned from the cache
+        obj_id = self.get_cached_obj_id(jamf_url, object_name, object_type, filter_name)
+        if obj_id is not None:
+            return obj_id
+
         # define the relationship between the object types and their URL
         if "JSSResource" in self.api_endpoints(object_type):
+            # try fetching the object by name before downloading the whole list
+            direct_name_lookup = self.env.get("direct_name_lookup")
+            if direct_name_lookup and direct_name_lookup != "False":
+                obj_id = self.get_classic_obj_id_by_name(
+                    jamf_url, object_name, object_type, token
+                )
+                if obj_id:
+                    self.cache_obj_ids(
+                        jamf_url, object_type, filter_name, {object_name: obj_id}
+                    )
+                    return obj_id
+
             # do XML stuff
             url = jamf_url + "/" + self.api_endpoints(object_type)
             r = self.curl(request="GET", url=url, token=token)
@@ -607,44 +1496,310 @@ class JamfUploaderBase(Processor):
                     object_list,
                     verbose_level=4,
                 )
-                obj_id = 0
+                # build a case-insensitive map of the whole list, so that later lookups
+                # of this object type do not need to download it again
+                obj_ids = {}
                 for obj in object_list[self.object_list_types(object_type)]:
                     self.output(
                         obj,
                         verbose_level=4,
                     )
-                    # we need to check for a case-insensitive match
-                    if obj["name"].lower() == object_name.lower():
-                        obj_id = obj["id"]
-                return obj_id
+                    obj_ids[obj["name"].lower()] = obj["id"]
+                self.cache_obj_ids(jamf_url, object_type, filter_name, obj_ids, True)
+                self.output(
+                    f"Looked up {object_type} '{object_name}' from the full object list",
+                    verbose_level=2,
+                )
+                return obj_ids.get(object_name.lower(), 0)
             elif r.status_code == 401:
                 raise ProcessorError(
                     "ERROR: Jamf returned status code '401' - Access denied."
                 )
         else:
             # do JSON stuff
-            url_filter = (
-                f"?page=0&page-size=1000&sort=id&filter={filter_name}"
-                f"%3D%3D%22{quote(object_name)}%22"
+            url_filter = f"filter={filter_name}%3D%3D%22{quote(object_name)}%22"
+            obj_id = 0
+            for obj in self.get_paged_api_objects(
+                jamf_url, object_type, token, url_filter
+            ):
+                self.output(
+                    f"ID: {obj.get('id')} NAME: {obj.get(filter_name)}",
+                    verbose_level=3,
+                )
+                if obj[filter_name] == object_name:
+                    obj_id = obj["id"]
+                    break
+            if obj_id:
+                # only the filtered results are known, so this map is incomplete
+                self.cache_obj_ids(
+                    jamf_url, object_type, filter_name, {object_name: obj_id}
+                )
+            return obj_id
+
+    def get_paged_api_objects(self, jamf_url, object_type, token, url_filter=""):
+        """Iterate over all the objects in a Jamf Pro API collection.
+
+        The first page gives the totalCount of objects, then the remaining pages are
+        fetched concurrently. The page size is set with api_page_size (default 1000).
+        url_filter can contain other query parameters such as a filter or sort order.
+        """
+        try:
+            page_size = max(int(self.env.get("api_page_size") or 1000), 1)
+        except ValueError:
+            page_size = 1000
+        if "sort=" not in url_filter:
+            # a stable order is needed so that no object is missed between pages
+            url_filter = "&".join(filter(None, ["sort=id", url_filter]))
+        url = f"{jamf_url}/{self.api_endpoints(object_type)}"
+
+        def page_url(page):
+            return f"{url}?page={page}&page-size={page_size}&{url_filter}"
+
+        r = self.curl(request="GET", url=page_url(0), token=token)
+        if r.status_code == 401:
+            raise ProcessorError(
+                "ERROR: Jamf returned status code '401' - Access denied."
             )
-            url = jamf_url + "/" + self.api_endpoints(object_type) + url_filter
-            r = self.curl(request="GET", url=url, token=token)
-            if r.status_code == 200:
+        if r.status_code != 200:
+            self.output(f"Return code: {r.status_code}", verbose_level=2)
+            return
+        yield from r.output["results"]
+
+        total_count = int(r.output.get("totalCount") or 0)
+        pages = -(-total_count // page_size)
+        if pages < 2:
+            return
+        self.output(
+            f"Fetching {pages - 1} more pages of {self.api_endpoints(object_type)} "
+            f"({total_count} objects)",
+            verbose_level=2,
+        )
+        responses = self.run_coroutines(
+            *[
+                self.async_curl(request="GET", url=page_url(page), token=token)
+                for page in range(1, pages)
+            ]
+        )
+        for page, r in enumerate(responses, start=1):
+            if r.status_code != 200:
+                raise ProcessorError(
+                    f"ERROR: Could not get page {page} of "
+                    f"{self.api_endpoints(object_type)} (status code {r.status_code})"
+                )
+            yield from r.output["results"]
+
+    def get_classic_obj_id_by_name(self, jamf_url, object_name, object_type, token):
+        """Look up a Classic API object using its /name/ endpoint. Returns the ID, or 0 if
+        the object was not found this way, in which case the full object list must be
+        checked, as some object types and names cannot be fetched by name."""
+        # a slash cannot be used in the name endpoint, even if it is encoded
+        if "/" in object_name:
+            return 0
+        url = (
+            f"{jamf_url}/{self.api_endpoints(object_type)}/name/"
+            f"{quote(object_name, safe='')}"
+        )
+        r = self.curl(request="GET", url=url, token=token, accept_header="xml")
+        if r.status_code == 401:
+            raise ProcessorError(
+                "ERROR: Jamf returned status code '401' - Access denied."
+            )
+        if r.status_code != 200:
+            self.output(
+                f"{object_type} '{object_name}' not found by name "
+                f"(status code {r.status_code}), checking the full object list",
+                verbose_level=2,
+            )
+            return 0
+        try:
+            obj_xml = ET.fromstring(r.output)
+        except ET.ParseError:
+            return 0
+        obj_id = obj_xml.findtext("general/id") or obj_xml.findtext("id")
+        obj_name = obj_xml.findtext("general/name") or obj_xml.findtext("name") or ""
+        if not obj_id or obj_name.lower() != object_name.lower():
+            return 0
+        self.output(
+            f"Looked up {object_type} '{object_name}' using the name endpoint",
+            verbose_level=2,
+        )
+        return int(obj_id)
+
+    def get_cached_obj_id(self, jamf_url, object_name, object_type, filter_name="name"):
+        """Return the ID of an object from the cache of objects seen during this run.
+        Returns 0 if the object is known not to exist, or None if it is not known."""
+        key = (jamf_url, self.api_endpoints(object_type), filter_name)
+        with OBJ_ID_CACHE_LOCK:
+            cache = OBJ_ID_CACHE.get(key)
+            if cache is None:
+                return None
+            obj_id = cache["ids"].get(self.get_cache_name(key[1], object_name))
+            if obj_id is None and cache["complete"]:
                 obj_id = 0
+        if obj_id is not None:
+            self.output(
+                f"Using cached ID for {object_type} '{object_name}': {obj_id}",
+                verbose_level=2,
+            )
+        return obj_id
+
+    def cache_obj_ids(
+        self, jamf_url, object_type, filter_name, obj_ids, complete=False
+    ):
+        """Add names and IDs to the cache of objects seen during this run. If complete is
+        set, obj_ids is the full list of objects on the server"""
+        key = (jamf_url, self.api_endpoints(object_type), filter_name)
+        obj_ids = {
+            self.get_cache_name(key[1], name): obj_id
+            for name, obj_id in obj_ids.items()
+        }
+        with OBJ_ID_CACHE_LOCK:
+            if complete or key not in OBJ_ID_CACHE:
+                OBJ_ID_CACHE[key] = {"complete": complete, "ids": {}}
+            OBJ_ID_CACHE[key]["ids"].update(obj_ids)
+
+    def get_cache_name(self, endpoint, object_name):
+        """Return the name under which an object of the API endpoint is cached. Classic
+        API names are looked up without regard to case, but Jamf Pro API names must
+        match exactly"""
+        if endpoint.startswith("JSSResource"):
+            return object_name.lower()
+        return object_name
+
+    def forget_cached_obj_ids(self, jamf_url, object_type, filter_name="name"):
+        """Remove an object type from the cache of objects seen during this run, so that
+        the next lookup asks the server again"""
+        key = (jamf_url, self.api_endpoints(object_type), filter_name)
+        with OBJ_ID_CACHE_LOCK:
+            OBJ_ID_CACHE.pop(key, None)
+
+    def wait_until_visible(self, description, check):
+        """Call check() until it returns something other than None, and return that.
+
+        Newly created objects can take a while to be returned by the API. The first
+        checks are made after a short interval of poll_interval seconds (default 0.5),
+        which doubles after each check up to poll_max_interval (default 10), until
+        poll_timeout seconds (default 120) have passed, when a ProcessorError is raised.
+        """
+        interval = float(self.env.get("poll_interval") or 0.5)
+        max_interval = float(self.env.get("poll_max_interval") or 10)
+        timeout = float(self.env.get("poll_timeout") or 120)
+        start = monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            result = check()
+            elapsed = monotonic() - start
+            if result is not None:
+                self.output(
+                    f"{description} found after {elapsed:.1f}s "
+                    f"({attempt} attempt{'s' if attempt > 1 else ''})",
+                    verbose_level=1 if attempt > 1 else 2,
+                )
+                return result
+            if elapsed + interval > timeout:
+                raise ProcessorError(
+                    f"ERROR: {description} not found after {elapsed:.1f}s "
+                    f"({attempt} attempts)"
+                )
+            self.output(
+                f"{description} not found yet, checking again in {interval:.1f}s",
+                verbose_level=2,
+            )
+            sleep(interval)
+            interval = min(interval * 2, max_interval)
+
+    def get_request_obj_names(self, data):
+        """Return the names of the object sent in a request, from the file containing
+        the request body, as a dictionary of name field to name. The field is "name"
+        for Classic API objects, where it is found in the object or in its general
+        section, or the key of the JSON object for the Jamf Pro API."""
+        if not data or not os.path.isfile(data):
+            return {}
+        try:
+            with open(data, "rb") as f:
+                content = f.read()
+        except OSError:
+            return {}
+        try:
+            obj = json.loads(content)
+        except ValueError:
+            pass
+        else:
+            if not isinstance(obj, dict):
+                return {}
+            return {k: v for k, v in obj.items() if isinstance(v, str)}
+        try:
+            root = ET.fromstring(content)
+        except ET.ParseError:
+            return {}
+        name = root.findtext("name") or root.findtext("general/name")
+        return {"name": name} if name else {}
+
+    def update_obj_id_cache(self, url, request, r, data=""):
+        """Keep the cache of object IDs up to date after a successful POST, PUT or DELETE
+        request to an object. This is called by curl() for every request. Only object
+        types that have been looked up during this run are cached, so other requests are
+        ignored. The name of a created or updated object is read from the request body
+        in data. If it cannot be found there, the cache for the object type is dropped
+        rather than guessing the name."""
+        if (
+            request not in ("POST", "PUT", "DELETE")
+            or r.status_code is None
+            or r.status_code >= 400
+        ):
+            return
+        match = re.match(
+            r"(?P<server>.+?)/(?P<endpoint>JSSResource/\w+|api/v\d+/[\w-]+)"
+            r"(?:/id)?(?:/(?P<obj_id>\d+))?/?$",
+            url,
+        )
+        if not match:
+            return
+        server, endpoint, obj_id = match.group("server", "endpoint", "obj_id")
+        classic = endpoint.startswith("JSSResource")
+
+        # new objects take their ID from the response
+        if request != "DELETE" and not int(obj_id or 0):
+            obj_id = None
+            if isinstance(r.output, dict):
+                obj_id = r.output.get("id")
+            elif r.output:
                 output = r.output
-                for obj in output["results"]:
+                if isinstance(output, bytes):
+                    output = output.decode("utf-8", errors="ignore")
+                id_match = re.search(r"<id>(\d+)</id>", output)
+                obj_id = id_match.group(1) if id_match else None
+        if obj_id is not None:
+            obj_id = int(obj_id) if classic else str(obj_id)
+
+        with OBJ_ID_CACHE_LOCK:
+            keys = [key for key in OBJ_ID_CACHE if key[:2] == (server, endpoint)]
+        if not keys:
+            return
+        obj_names = {} if request == "DELETE" else self.get_request_obj_names(data)
+
+        with OBJ_ID_CACHE_LOCK:
+            for key in keys:
+                cache = OBJ_ID_CACHE.get(key)
+                if cache is None:
+                    continue
+                object_name = obj_names.get(key[2])
+                if obj_id is None or (request != "DELETE" and not object_name):
+                    # we cannot tell which object changed or what it is now called, so
+                    # look it up again next time
+                    del OBJ_ID_CACHE[key]
+                    continue
+                # a renamed or deleted object must not be found under its old name
+                for name in [
+                    k for k, v in cache["ids"].items() if str(v) == str(obj_id)
+                ]:
+                    del cache["ids"][name]
+                if request != "DELETE":
+                    cache["ids"][self.get_cache_name(endpoint, object_name)] = obj_id
                     self.output(
-                        f"ID: {obj.get('id')} NAME: {obj.get(filter_name)}",
-                        verbose_level=3,
+                        f"Cached ID for '{object_name}': {obj_id}", verbose_level=3
                     )
-                    if obj[filter_name] == object_name:
-                        obj_id = obj["id"]
-                        break
-                return obj_id
-            elif r.status_code == 401:
-                raise ProcessorError(
-                    "ERROR: Jamf returned status code '401' - Access denied."
-                )
 
     def substitute_assignable_keys(self, data, xml_escape=False):
         """substitutes any key in the inputted text using the %MY_KEY% nomenclature"""
@@ -807,16 +1962,16 @@ class JamfUploaderBase(Processor):
 
         # check for existing
         url = f"{jamf_url}/{self.api_endpoints(object_type)}"
-        r = self.curl(request="GET", url=url, token=token)
 
         # for Classic API
         if "JSSResource" in url:
+            r = self.curl(request="GET", url=url, token=token)
             object_list = json.loads(r.output)[self.object_list_types(object_type)]
             self.output(f"List of objects:\n{object_list}", verbose_level=3)
 
-        # for Jamf Pro API
+        # for Jamf Pro API, which returns the objects in pages
         else:
-            object_list = r.output["results"]
+            object_list = list(self.get_paged_api_objects(jamf_url, object_type, token))
             self.output(f"List of objects:\n{object_list}", verbose_level=3)
 
         return object_list
@@ -887,6 +2042,7 @@ class JamfUploaderBase(Processor):
             if value:
                 self.output(f"Value of '{obj_path}': {value}", verbose_level=2)
             return value
+        self.output(f"Return code: {r.status_code}", verbose_level=2)
 
     def pretty_print_xml(self, xml):
         """prettifies XML"""
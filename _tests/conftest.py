@@ -0,0 +1,127 @@
+"""
+Shared set-up for the unit tests of the JamfUploader helpers.
+
+Run from the root of the repo with:
+
+    /usr/local/autopkg/python -m pytest _tests
+"""
+
+import json
+import os.path
+import re
+import sys
+import types
+from urllib.parse import urlparse
+
+import pytest
+
+# the processors import their base modules from JamfUploaderLib
+LIB_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "JamfUploaderProcessors",
+    "JamfUploaderLib",
+)
+sys.path.insert(0, LIB_DIR)
+
+try:
+    import autopkglib  # noqa: F401 pylint: disable=unused-import
+except ImportError:
+    # AutoPkg installs autopkglib here
+    sys.path.append("/Library/AutoPkg")
+    try:
+        import autopkglib  # noqa: F401 pylint: disable=unused-import
+    except ImportError:
+        # without AutoPkg, provide the parts of autopkglib used by the helpers under
+        # test, so that they can be tested on any computer
+        autopkglib = types.ModuleType("autopkglib")
+
+        class ProcessorError(Exception):
+            """autopkglib.ProcessorError"""
+
+        class Processor:  # pylint: disable=too-few-public-methods
+            """autopkglib.Processor"""
+
+            def __init__(self, env=None, infile=None, outfile=None):
+                self.env = env or {}
+                self.infile = infile
+                self.outfile = outfile
+
+            def output(self, msg, verbose_level=1):
+                """print a message if the verbose level is high enough"""
+                if int(self.env.get("verbose", 0)) >= verbose_level:
+                    print(msg)
+
+        class APLooseVersion(tuple):
+            """autopkglib.APLooseVersion"""
+
+            def __new__(cls, version):
+                return super().__new__(
+                    cls,
+                    (
+                        int(part) if part.isdigit() else part
+                        for part in re.split(r"[.-]", str(version))
+                    ),
+                )
+
+        autopkglib.Processor = Processor
+        autopkglib.ProcessorError = ProcessorError
+        autopkglib.APLooseVersion = APLooseVersion
+        sys.modules["autopkglib"] = autopkglib
+
+
+@pytest.fixture(name="make_base")
+def fixture_make_base(tmp_path):
+    """Return a function that creates a JamfUploaderBase with the given env, using a
+    temporary directory for its temporary files"""
+    from JamfUploaderBase import (  # pylint: disable=import-outside-toplevel
+        JamfUploaderBase,
+    )
+
+    def make_base(**env):
+        env.setdefault("jamfupload_tmp_dir", str(tmp_path))
+        return JamfUploaderBase(env)
+
+    return make_base
+
+
+@pytest.fixture(name="make_pkg_uploader")
+def fixture_make_pkg_uploader(tmp_path):
+    """Return a function that creates a JamfPackageUploaderBase with the given env"""
+    from JamfPackageUploaderBase import (  # pylint: disable=import-outside-toplevel
+        JamfPackageUploaderBase,
+    )
+
+    def make_pkg_uploader(**env):
+        env.setdefault("jamfupload_tmp_dir", str(tmp_path))
+        return JamfPackageUploaderBase(env)
+
+    return make_pkg_uploader
+
+
+@pytest.fixture(name="responses")
+def fixture_responses(monkeypatch):
+    """Replace the curl binary with one that answers from a dictionary of
+    (method, path): (status code, body), and start with an empty object ID cache.
+    Each request is added to the "sent" list."""
+    import JamfUploaderBase  # pylint: disable=import-outside-toplevel
+
+    responses = {"sent": []}
+
+    def check_output(curl_cmd):
+        url = curl_cmd[4]
+        request = "GET"
+        if "--request" in curl_cmd:
+            request = curl_cmd[curl_cmd.index("--request") + 1]
+        responses["sent"].append((request, urlparse(url).path))
+        status_code, body = responses[(request, urlparse(url).path)]
+        headers_file = curl_cmd[curl_cmd.index("--dump-header") + 1]
+        with open(headers_file, "w", encoding="utf-8") as file:
+            file.write(f"HTTP/1.1 {status_code}\r\n\r\n")
+        output_file = curl_cmd[curl_cmd.index("--output") + 1]
+        with open(output_file, "w", encoding="utf-8") as file:
+            file.write(body if isinstance(body, str) else json.dumps(body))
+        return b""
+
+    monkeypatch.setattr(JamfUploaderBase.subprocess, "check_output", check_output)
+    monkeypatch.setattr(JamfUploaderBase, "OBJ_ID_CACHE", {})
+    return responses
@@ -0,0 +1,353 @@
+"""Unit tests for the helpers in JamfPackageUploaderBase"""
+
+import hashlib
+import os
+import threading
+import types
+import zipfile
+from datetime import datetime
+
+import pytest
+from autopkglib import ProcessorError  # pylint: disable=import-error
+
+import JamfPackageUploaderBase
+from JamfPackageUploaderBase import FilePart, ProgressPercentage
+
+
+@pytest.fixture(name="pkg")
+def fixture_pkg(tmp_path):
+    """a file of 1 MB and a bit of data that is not a multiple of any block size"""
+    path = tmp_path / "test.pkg"
+    path.write_bytes(os.urandom(1024 * 1024 + 12345))
+    return path
+
+
+def fake_now(monkeypatch, now):
+    """make get_bandwidth_limit see the given local time"""
+
+    class FakeDatetime(datetime):
+        """datetime with a fixed now()"""
+
+        @classmethod
+        def now(cls, tz=None):
+            return now
+
+    monkeypatch.setattr(JamfPackageUploaderBase, "datetime", FakeDatetime)
+
+
+# multi-digest hashing
+
+
+def test_calculate_digests_matches_hashlib(make_pkg_uploader, pkg):
+    data = pkg.read_bytes()
+    digests = make_pkg_uploader().calculate_digests(
+        str(pkg), ("sha512", "md5", "sha3_512"), block_size=64 * 1024
+    )
+    assert digests == {
+        "sha512": hashlib.sha512(data).hexdigest(),
+        "md5": hashlib.md5(data).hexdigest(),
+        "sha3_512": hashlib.sha3_512(data).hexdigest(),
+    }
+
+
+def test_calculate_digests_copies_and_reports_progress(
+    make_pkg_uploader, pkg, tmp_path
+):
+    copied = []
+    destination = tmp_path / "copy.pkg"
+    digests = make_pkg_uploader().calculate_digests(
+        str(pkg),
+        destination=str(destination),
+        block_size=100 * 1024,
+        progress=copied.append,
+    )
+    assert destination.read_bytes() == pkg.read_bytes()
+    assert sum(copied) == pkg.stat().st_size
+    assert digests["sha512"] == hashlib.sha512(pkg.read_bytes()).hexdigest()
+
+
+def test_calculate_digests_of_empty_file(make_pkg_uploader, tmp_path):
+    path = tmp_path / "empty.pkg"
+    path.write_bytes(b"")
+    assert make_pkg_uploader().calculate_digests(str(path)) == {
+        "sha512": hashlib.sha512(b"").hexdigest()
+    }
+
+
+# hashes shared between file share copies
+
+
+def hash_during_copy(uploader, pkg, copy_succeeds):
+    """Claim the hashes of the package for a copy, ask for the SHA-512 from another
+    thread while the copy runs, and return what that thread got and the number of
+    times the package was hashed"""
+    reads = []
+    calculate_digests = uploader.calculate_digests
+
+    def counting_calculate_digests(*args, **kwargs):
+        reads.append(args)
+        return calculate_digests(*args, **kwargs)
+
+    uploader.calculate_digests = counting_calculate_digests
+    uploader.start_pkg_digests(str(pkg), ["sha512"], None, background=False)
+    assert uploader.pending_pkg_digests() == ["sha512"]
+    # only the first copy hashes the package
+    other_copy = []
+    thread = threading.Thread(
+        target=lambda: other_copy.append(uploader.pending_pkg_digests())
+    )
+    thread.start()
+    thread.join()
+    assert other_copy == [[]]
+
+    result = []
+    waiter = threading.Thread(
+        target=lambda: result.append(uploader.get_pkg_digest("sha512"))
+    )
+    waiter.start()
+    waiter.join(0.2)
+    assert waiter.is_alive(), "get_pkg_digest did not wait for the copy"
+    uploader.add_pkg_digests(
+        calculate_digests(str(pkg), ["sha512"]) if copy_succeeds else {}
+    )
+    waiter.join(5)
+    return result[0], len(reads)
+
+
+def test_get_pkg_digest_waits_for_copy(make_pkg_uploader, pkg):
+    sha512, reads = hash_during_copy(make_pkg_uploader(), pkg, copy_succeeds=True)
+    assert sha512 == hashlib.sha512(pkg.read_bytes()).hexdigest()
+    assert reads == 0
+
+
+def test_get_pkg_digest_hashes_package_if_copy_fails(make_pkg_uploader, pkg):
+    uploader = make_pkg_uploader()
+    sha512, reads = hash_during_copy(uploader, pkg, copy_succeeds=False)
+    assert sha512 == hashlib.sha512(pkg.read_bytes()).hexdigest()
+    assert reads == 1
+
+
+# FilePart
+
+
+def test_file_part_reads_only_its_part(pkg):
+    data = pkg.read_bytes()
+    with FilePart(str(pkg), 1000, 5000) as part:
+        assert len(part) == 5000
+        assert part.read(10) == data[1000:1010]
+        assert part.tell() == 10
+        assert part.read() == data[1010:6000]
+        assert part.read() == b""
+
+
+def test_file_part_seek(pkg):
+    data = pkg.read_bytes()
+    with FilePart(str(pkg), 2048, 4096) as part:
+        part.read()
+        assert part.seek(0) == 0
+        assert part.read(4) == data[2048:2052]
+        assert part.seek(-4, os.SEEK_END) == 4092
+        assert part.read(100) == data[6140:6144]
+        assert part.seek(10, os.SEEK_CUR) == 4096
+        assert part.seek(-1) == 0
+
+
+def test_last_file_part_is_shortened(pkg):
+    size = pkg.stat().st_size
+    with FilePart(str(pkg), size - 100, 1000) as part:
+        assert len(part) == 100
+        assert part.read() == pkg.read_bytes()[-100:]
+    with FilePart(str(pkg), size + 100, 1000) as part:
+        assert len(part) == 0
+        assert part.read() == b""
+
+
+def test_file_part_reports_bytes_sent(pkg):
+    sent = []
+    with FilePart(str(pkg), 0, 1000, callback=sent.append) as part:
+        part.read(10)
+        part.read()
+        # a rewound part is counted again as it is sent again
+        part.seek(100)
+        part.read(50)
+        assert sent == [10, 990, -900, 50]
+
+
+def test_file_part_does_not_report_checksum_reads(pkg):
+    sent = []
+    with FilePart(str(pkg), 0, 1000, callback=sent.append) as part:
+        part.signal_not_transferring()
+        part.read()
+        part.seek(0)
+        part.signal_transferring()
+        part.read(400)
+        assert sent == [400]
+
+
+# bandwidth limit
+
+
+def test_bandwidth_limit_holds_back_transfer(pkg, monkeypatch):
+    now = [100.0]
+    waits = []
+    monkeypatch.setattr(JamfPackageUploaderBase, "monotonic", lambda: now[0])
+    monkeypatch.setattr(JamfPackageUploaderBase, "sleep", waits.append)
+    progress = ProgressPercentage(
+        str(pkg), output=lambda *args, **kwargs: None, bandwidth_limit=1000
+    )
+    progress(500)
+    assert waits == [0.5]
+    now[0] += 0.5
+    progress.set_bandwidth_limit(0)
+    progress(5000)
+    assert waits == [0.5]
+    # a new limit applies to the bytes sent after it is set
+    progress.set_bandwidth_limit(100)
+    progress(100)
+    assert waits == [0.5, 1.0]
+
+
+def test_s3_upload_limit_is_checked_for_each_part(
+    make_pkg_uploader, pkg, tmp_path, monkeypatch
+):
+    pytest.importorskip("boto3")
+    waits = []
+    monkeypatch.setattr(JamfPackageUploaderBase, "sleep", waits.append)
+    uploader = make_pkg_uploader(s3_part_size="5", s3_max_concurrency="1")
+    pkg.write_bytes(os.urandom(12 * 1024 * 1024))
+    transfer_config = uploader.get_s3_transfer_config(pkg.stat().st_size)
+    # the package is uploaded in three parts, and the limit starts after the first
+    limits = iter([0, 1024, 1024])
+    monkeypatch.setattr(uploader, "get_bandwidth_limit", lambda: next(limits))
+    waits_per_part = []
+
+    class S3Client:  # pylint: disable=missing-function-docstring
+        """the parts of an S3 client used for a multipart upload"""
+
+        meta = types.SimpleNamespace(
+            events=types.SimpleNamespace(
+                register_first=lambda *args, **kwargs: None,
+                register_last=lambda *args, **kwargs: None,
+            )
+        )
+
+        def create_multipart_upload(self, **kwargs):
+            return {"UploadId": "1"}
+
+        def upload_part(self, Body, **kwargs):  # pylint: disable=invalid-name
+            waits_before = len(waits)
+            while Body.read(1024 * 1024):
+                pass
+            waits_per_part.append(len(waits) - waits_before)
+            return {"ETag": str(kwargs["PartNumber"])}
+
+        def complete_multipart_upload(self, **kwargs):
+            pass
+
+    uploader.resumable_s3_upload(
+        S3Client(),
+        str(pkg),
+        "bucket",
+        "pkg.pkg",
+        transfer_config,
+        str(tmp_path / "state.json"),
+        "sha512",
+    )
+    assert waits_per_part[0] == 0
+    assert waits_per_part[1] > 0
+    assert waits_per_part[2] > 0
+
+
+# bandwidth schedule
+
+
+def test_parse_bandwidth_schedule_string(make_pkg_uploader):
+    windows = make_pkg_uploader().parse_bandwidth_schedule(
+        "Mon-Fri 08:00-18:00=2, 22:00-06:30=0; Sat 9:15-12:00=0.5"
+    )
+    assert windows == [
+        ({0, 1, 2, 3, 4}, 480, 1080, 2.0),
+        (set(range(7)), 1320, 390, 0.0),
+        ({5}, 555, 720, 0.5),
+    ]
+
+
+def test_parse_bandwidth_schedule_wraps_days(make_pkg_uploader):
+    windows = make_pkg_uploader().parse_bandwidth_schedule({"Sat-Mon 00:00-23:59": 1})
+    assert windows == [({5, 6, 0}, 0, 1439, 1.0)]
+
+
+@pytest.mark.parametrize(
+    "schedule",
+    ["08:00-18:00", "Mon-Fri=2", "Funday 08:00-18:00=2", "08:00-18:00=fast"],
+)
+def test_parse_bandwidth_schedule_rejects_invalid_entries(make_pkg_uploader, schedule):
+    with pytest.raises(ProcessorError):
+        make_pkg_uploader().parse_bandwidth_schedule(schedule)
+
+
+@pytest.mark.parametrize(
+    "now,limit",
+    [
+        (datetime(2026, 10, 14, 9, 0), 2),  # Wednesday, in working hours
+        (datetime(2026, 10, 14, 23, 0), 0),  # Wednesday night
+        (datetime(2026, 10, 15, 5, 59), 0),  # after midnight, before the window ends
+        (datetime(2026, 10, 17, 12, 0), 1),  # Saturday, outside any window
+    ],
+)
+def test_bandwidth_limit_follows_schedule(make_pkg_uploader, monkeypatch, now, limit):
+    fake_now(monkeypatch, now)
+    uploader = make_pkg_uploader(
+        pkg_bandwidth_limit="1",
+        pkg_bandwidth_schedule="Mon-Fri 08:00-18:00=2, 22:00-06:00=0",
+    )
+    assert uploader.get_bandwidth_limit() == limit * 1024 * 1024
+
+
+# zip engine
+
+
+def make_bundle(path):
+    """a bundle package with a compressed payload and some plain text"""
+    os.makedirs(path / "Contents" / "Resources" / "en.lproj")
+    (path / "Contents" / "Info.plist").write_text("<plist/>\n" * 200)
+    (path / "Contents" / "Archive.pax.gz").write_bytes(b"\x1f\x8b" + os.urandom(4096))
+    (path / "Contents" / "Resources" / "en.lproj" / "Description.plist").write_text(
+        "<plist/>\n"
+    )
+    return path
+
+
+def test_deterministic_zip_is_reproducible(make_pkg_uploader, tmp_path):
+    bundle = make_bundle(tmp_path / "Test.pkg")
+    uploader = make_pkg_uploader(deterministic_zip="True")
+    zip_path = uploader.zip_pkg_path(str(bundle), str(tmp_path))
+    first = open(zip_path, "rb").read()  # pylint: disable=consider-using-with
+    os.remove(zip_path)
+
+    # change the timestamps and permissions, which should not change the zip
+    for root, _, files in os.walk(bundle):
+        for name in files:
+            os.utime(os.path.join(root, name), (1e9, 1e9))
+            os.chmod(os.path.join(root, name), 0o600)
+    uploader.zip_pkg_path(str(bundle), str(tmp_path))
+    assert open(zip_path, "rb").read() == first  # pylint: disable=consider-using-with
+
+
+def test_zip_contains_bundle_and_stores_compressed_members(make_pkg_uploader, tmp_path):
+    bundle = make_bundle(tmp_path / "Test.pkg")
+    zip_path = make_pkg_uploader().zip_pkg_path(str(bundle), str(tmp_path))
+    with zipfile.ZipFile(zip_path) as zf:
+        members = {info.filename: info for info in zf.infolist()}
+        assert (
+            zf.read("Test.pkg/Contents/Info.plist")
+            == (bundle / "Contents" / "Info.plist").read_bytes()
+        )
+    assert "Test.pkg/" in members
+    assert "Test.pkg/Contents/Resources/en.lproj/Description.plist" in members
+    assert members["Test.pkg/Contents/Archive.pax.gz"].compress_type == (
+        zipfile.ZIP_STORED
+    )
+    assert members["Test.pkg/Contents/Info.plist"].compress_type == (
+        zipfile.ZIP_DEFLATED
+    )
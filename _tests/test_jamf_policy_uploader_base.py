@@ -0,0 +1,64 @@
+"""Unit tests for the helpers in JamfPolicyUploaderBase"""
+
+import pytest
+from autopkglib import ProcessorError  # pylint: disable=import-error
+
+from JamfPolicyUploaderBase import JamfPolicyUploaderBase
+
+JSS = "https://example.jamfcloud.com"
+
+
+@pytest.fixture(name="uploader")
+def fixture_uploader(tmp_path):
+    """a policy uploader that would poll for a long time if it were to poll"""
+    return JamfPolicyUploaderBase(
+        {
+            "jamfupload_tmp_dir": str(tmp_path),
+            "poll_interval": "30",
+            "poll_timeout": "120",
+        }
+    )
+
+
+@pytest.fixture(name="icon")
+def fixture_icon(tmp_path):
+    """an icon file to upload"""
+    path = tmp_path / "Firefox.png"
+    path.write_bytes(b"\x89PNG\r\n\x1a\n")
+    return str(path)
+
+
+@pytest.mark.parametrize("status_code", [401, 403, 404, 500])
+def test_icon_upload_fails_fast_if_policy_cannot_be_read(
+    uploader, icon, responses, status_code
+):
+    responses[("GET", "/JSSResource/policies/id/5")] = (status_code, "")
+    with pytest.raises(ProcessorError, match="could not read policy"):
+        uploader.upload_policy_icon(JSS, "Firefox", icon, False, "token", 0, "5")
+    assert responses["sent"] == [("GET", "/JSSResource/policies/id/5")]
+
+
+def test_icon_upload_skipped_if_icon_unchanged(uploader, icon, responses):
+    responses[("GET", "/JSSResource/policies/id/5")] = (
+        200,
+        {
+            "policy": {
+                "self_service": {"self_service_icon": {"filename": "Firefox.png"}}
+            }
+        },
+    )
+    assert (
+        uploader.upload_policy_icon(JSS, "Firefox", icon, False, "token", 0, "5")
+        == "Firefox.png"
+    )
+    assert responses["sent"] == [("GET", "/JSSResource/policies/id/5")]
+
+
+def test_icon_uploaded_if_icon_changed(uploader, icon, responses):
+    responses[("GET", "/JSSResource/policies/id/5")] = (
+        200,
+        {"policy": {"self_service": {"self_service_icon": {"filename": "Old.png"}}}},
+    )
+    responses[("POST", "/JSSResource/fileuploads/policies/id/5")] = (201, "")
+    uploader.upload_policy_icon(JSS, "Firefox", icon, False, "token", 0, "5")
+    assert responses["sent"][-1] == ("POST", "/JSSResource/fileuploads/policies/id/5")
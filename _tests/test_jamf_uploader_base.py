@@ -0,0 +1,370 @@
+"""Unit tests for the helpers in JamfUploaderBase"""
+
+import io
+import json
+import subprocess
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+
+import JamfUploaderBase
+from JamfUploaderBase import ProgressReader, TokenBucket
+
+Response = namedtuple("Response", ["headers", "status_code", "output"])
+
+
+def response(status_code, *headers):
+    """a response in the shape returned by curl()"""
+    return Response([f"HTTP/1.1 {status_code}", *headers], status_code, None)
+
+
+def request_body(tmp_path, body):
+    """write a request body to a file, as the processors do"""
+    path = tmp_path / "body.txt"
+    path.write_text(body if isinstance(body, str) else json.dumps(body))
+    return str(path)
+
+
+# retry classification
+
+
+@pytest.mark.parametrize("status_code", [408, 425, 429, 500, 502, 503, 504])
+def test_transient_status_codes_are_retried(make_base, status_code):
+    assert make_base().is_retryable(response(status_code))
+
+
+@pytest.mark.parametrize("status_code", [200, 201, 400, 401, 403, 404, 409])
+def test_other_status_codes_are_not_retried(make_base, status_code):
+    assert not make_base().is_retryable(response(status_code))
+
+
+def test_transport_failure_is_retried(make_base):
+    base = make_base()
+    assert base.is_retryable(None)
+    assert base.is_retryable(Response(None, None, None))
+
+
+@pytest.mark.parametrize(
+    "status_code,retryable",
+    [(429, True), (503, True), (500, False), (502, False), (504, False)],
+)
+def test_post_is_only_retried_when_server_asks(make_base, status_code, retryable):
+    assert make_base().is_retryable(response(status_code), idempotent=False) is (
+        retryable
+    )
+
+
+def test_post_is_only_retried_if_it_was_not_sent(make_base):
+    base = make_base()
+    assert base.is_retryable(None, idempotent=False, request_sent=False)
+    assert not base.is_retryable(None, idempotent=False, request_sent=True)
+
+
+# Retry-After
+
+
+def test_retry_after_seconds(make_base):
+    assert make_base().get_retry_after(response(429, "Retry-After: 7")) == 7
+
+
+def test_retry_after_header_name_is_case_insensitive(make_base):
+    assert make_base().get_retry_after(response(503, "retry-after:  12")) == 12
+
+
+def test_retry_after_http_date(make_base):
+    retry_at = datetime.now(timezone.utc) + timedelta(seconds=30)
+    delay = make_base().get_retry_after(
+        response(503, f"Retry-After: {format_datetime(retry_at, usegmt=True)}")
+    )
+    assert 25 <= delay <= 30
+
+
+def test_retry_after_in_the_past_is_zero(make_base):
+    retry_at = datetime.now(timezone.utc) - timedelta(minutes=5)
+    assert (
+        make_base().get_retry_after(
+            response(429, f"Retry-After: {format_datetime(retry_at, usegmt=True)}")
+        )
+        == 0
+    )
+
+
+@pytest.mark.parametrize(
+    "r",
+    [
+        None,
+        response(500, "Retry-After: 7"),
+        response(429),
+        response(429, "Retry-After: soon"),
+    ],
+)
+def test_retry_after_is_ignored(make_base, r):
+    assert make_base().get_retry_after(r) is None
+
+
+# retry delay
+
+
+def test_retry_delay_grows_exponentially_with_jitter(make_base):
+    base = make_base(retry_base_delay="2", retry_max_delay="60")
+    for attempt, delay in [(1, 2), (2, 4), (3, 8), (4, 16)]:
+        for _ in range(20):
+            assert delay / 2 <= base.get_retry_delay(attempt) <= delay
+
+
+def test_retry_delay_is_capped(make_base):
+    base = make_base(retry_base_delay="2", retry_max_delay="10")
+    for _ in range(20):
+        assert 5 <= base.get_retry_delay(20) <= 10
+
+
+def test_retry_delay_honours_retry_after(make_base):
+    assert make_base().get_retry_delay(1, response(429, "Retry-After: 42")) == 42
+
+
+def test_retry_delay_is_at_least_sleep_time(make_base):
+    base = make_base(retry_base_delay="1")
+    assert base.get_retry_delay(1, sleep_time=30) == 30
+
+
+# TokenBucket
+
+
+def test_token_bucket_refill():
+    bucket = TokenBucket(rate=2, burst=4)
+    # half a second at 2 per second gives one token, which is taken
+    assert bucket.refill(0, 10.0, 10.5) == (0, 10.5, 0)
+    # the bucket never holds more than the burst size
+    assert bucket.refill(3, 0.0, 100.0) == (3, 100.0, 0)
+    # with half a token left, the wait is the time to earn the other half
+    tokens, updated, wait = bucket.refill(0, 10.0, 10.25)
+    assert (tokens, updated, wait) == (0.5, 10.25, 0.25)
+
+
+def test_token_bucket_allows_burst_then_waits():
+    bucket = TokenBucket(rate=1, burst=3)
+    assert [bucket.take() for _ in range(3)] == [0, 0, 0]
+    assert bucket.take() > 0.9
+
+
+def test_token_bucket_shared_through_state_file(tmp_path):
+    state_file = str(tmp_path / "rate.json")
+    first = TokenBucket(rate=0.1, burst=2, state_file=state_file)
+    second = TokenBucket(rate=0.1, burst=2, state_file=state_file)
+    assert first.take() == 0
+    assert second.take() == 0
+    # both buckets have used the same two tokens
+    assert first.take() > 0
+    with open(state_file, "r", encoding="utf-8") as file:
+        assert json.load(file)["tokens"] < 1
+
+
+def test_token_bucket_ignores_unreadable_state_file(tmp_path):
+    state_file = tmp_path / "rate.json"
+    state_file.write_text("not json", encoding="utf-8")
+    assert TokenBucket(rate=1, burst=1, state_file=str(state_file)).take() == 0
+
+
+def test_rate_limit_applies_to_jss_url_or_listed_servers(make_base):
+    base = make_base(JSS_URL="https://a.jamfcloud.com", api_rate_limit="5")
+    assert base.get_rate_limit("https://a.jamfcloud.com/api/v1/x") == 5
+    assert base.get_rate_limit("https://b.jamfcloud.com/api/v1/x") == 0
+    base = make_base(api_rate_limit={"https://b.jamfcloud.com": 3})
+    assert base.get_rate_limit("https://b.jamfcloud.com/JSSResource/x") == 3
+
+
+def test_host_semaphore_is_shared_by_processors(make_base, monkeypatch):
+    monkeypatch.setattr(JamfUploaderBase, "HOST_SEMAPHORES", {})
+    url = "https://a.jamfcloud.com/api/v1/x"
+    assert make_base().get_host_semaphore(url) is make_base().get_host_semaphore(url)
+
+
+# object ID cache
+
+JSS = "https://example.jamfcloud.com"
+
+
+def test_jamf_pro_api_names_are_case_sensitive(make_base, responses, monkeypatch):
+    base = make_base()
+    monkeypatch.setattr(
+        base,
+        "get_paged_api_objects",
+        lambda *args: iter([{"id": "3", "name": "Apps"}]),
+    )
+    assert base.get_api_obj_id_from_name(JSS, "Apps", "category", "token") == "3"
+    assert base.get_cached_obj_id(JSS, "Apps", "category") == "3"
+    assert base.get_cached_obj_id(JSS, "APPS", "category") is None
+    assert base.get_api_obj_id_from_name(JSS, "APPS", "category", "token") == 0
+    assert not responses["sent"]
+
+
+def test_complete_jamf_pro_api_listing_is_case_sensitive(make_base, responses):
+    base = make_base()
+    base.cache_obj_ids(
+        JSS, "package_v1", "packageName", {"Apps.pkg": "1"}, complete=True
+    )
+    assert base.get_cached_obj_id(JSS, "Apps.pkg", "package_v1", "packageName") == "1"
+    assert base.get_cached_obj_id(JSS, "apps.pkg", "package_v1", "packageName") == 0
+
+
+def test_classic_api_names_are_not_case_sensitive(make_base, responses):
+    responses[("GET", "/JSSResource/policies")] = (
+        200,
+        {"policies": [{"id": 1, "name": "Firefox"}, {"id": 2, "name": "Chrome"}]},
+    )
+    base = make_base()
+    assert base.get_api_obj_id_from_name(JSS, "FIREFOX", "policy", "token") == 1
+    assert base.get_api_obj_id_from_name(JSS, "chrome", "policy", "token") == 2
+    assert base.get_api_obj_id_from_name(JSS, "Safari", "policy", "token") == 0
+    assert len(responses["sent"]) == 1
+
+
+def test_classic_post_adds_new_object_to_cache(make_base, responses, tmp_path):
+    responses[("POST", "/JSSResource/policies/id/0")] = (
+        201,
+        "<policy><id>7</id></policy>",
+    )
+    base = make_base()
+    base.cache_obj_ids(JSS, "policy", "name", {"firefox": 1}, complete=True)
+    assert base.get_cached_obj_id(JSS, "Chrome", "policy") == 0
+    base.curl(
+        request="POST",
+        url=f"{JSS}/JSSResource/policies/id/0",
+        token="token",
+        data=request_body(
+            tmp_path, "<policy><general><name>Chrome</name></general></policy>"
+        ),
+    )
+    assert base.get_cached_obj_id(JSS, "chrome", "policy") == 7
+    assert base.get_cached_obj_id(JSS, "Firefox", "policy") == 1
+
+
+def test_classic_put_renames_object_in_cache(make_base, responses, tmp_path):
+    responses[("PUT", "/JSSResource/policies/id/1")] = (
+        201,
+        "<policy><id>1</id></policy>",
+    )
+    base = make_base()
+    base.cache_obj_ids(JSS, "policy", "name", {"firefox": 1}, complete=True)
+    base.curl(
+        request="PUT",
+        url=f"{JSS}/JSSResource/policies/id/1",
+        token="token",
+        data=request_body(
+            tmp_path, "<policy><general><name>Firefox ESR</name></general></policy>"
+        ),
+    )
+    assert base.get_cached_obj_id(JSS, "Firefox ESR", "policy") == 1
+    assert base.get_cached_obj_id(JSS, "Firefox", "policy") == 0
+
+
+def test_classic_delete_removes_object_from_cache(make_base, responses):
+    responses[("DELETE", "/JSSResource/policies/id/1")] = (200, "")
+    base = make_base()
+    base.cache_obj_ids(JSS, "policy", "name", {"firefox": 1}, complete=True)
+    base.curl(request="DELETE", url=f"{JSS}/JSSResource/policies/id/1", token="token")
+    assert base.get_cached_obj_id(JSS, "Firefox", "policy") == 0
+
+
+def test_unknown_name_drops_cache(make_base, responses, tmp_path):
+    responses[("PUT", "/JSSResource/policies/id/1")] = (201, "<policy/>")
+    base = make_base()
+    base.cache_obj_ids(JSS, "policy", "name", {"firefox": 1}, complete=True)
+    base.curl(
+        request="PUT",
+        url=f"{JSS}/JSSResource/policies/id/1",
+        token="token",
+        data=request_body(tmp_path, "<policy><scope/></policy>"),
+    )
+    assert base.get_cached_obj_id(JSS, "Firefox", "policy") is None
+
+
+def test_failed_request_leaves_cache_alone(make_base, responses, tmp_path):
+    responses[("PUT", "/JSSResource/policies/id/1")] = (409, "<error/>")
+    base = make_base()
+    base.cache_obj_ids(JSS, "policy", "name", {"firefox": 1}, complete=True)
+    base.curl(
+        request="PUT",
+        url=f"{JSS}/JSSResource/policies/id/1",
+        token="token",
+        data=request_body(tmp_path, "<policy><name>Chrome</name></policy>"),
+    )
+    assert base.get_cached_obj_id(JSS, "Firefox", "policy") == 1
+    assert base.get_cached_obj_id(JSS, "Chrome", "policy") == 0
+
+
+def test_jamf_pro_api_post_keeps_case_of_new_name(make_base, responses, tmp_path):
+    responses[("POST", "/api/v1/categories")] = (201, {"id": "5", "href": ""})
+    base = make_base()
+    base.cache_obj_ids(JSS, "category", "name", {"Tools": "2"})
+    base.curl(
+        request="POST",
+        url=f"{JSS}/api/v1/categories",
+        token="token",
+        data=request_body(tmp_path, {"name": "Apps", "priority": 9}),
+    )
+    assert base.get_cached_obj_id(JSS, "Apps", "category") == "5"
+    assert base.get_cached_obj_id(JSS, "apps", "category") is None
+    assert base.get_cached_obj_id(JSS, "Tools", "category") == "2"
+
+
+# upload progress
+
+
+class FakeCurl:
+    """a curl process that writes the given chunks of progress bar output and exits"""
+
+    def __init__(self, chunks, returncode=0):
+        self.stderr = self
+        self.chunks = list(chunks)
+        self.returncode = returncode
+
+    def read1(self, size):  # pylint: disable=unused-argument
+        """the next chunk written by curl"""
+        return self.chunks.pop(0) if self.chunks else b""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+def test_curl_progress_bar_is_passed_on(make_base, monkeypatch):
+    monkeypatch.setattr(
+        JamfUploaderBase.subprocess,
+        "Popen",
+        lambda *args, **kwargs: FakeCurl(
+            [b"###    10.0%\r", b"#######   25.5%\r####### 25.5%\r", b"100.0%\n"]
+        ),
+    )
+    sent = []
+    make_base().run_curl_with_progress(["curl", "--silent"], 1000, sent.append)
+    assert sent == [100, 155, 745]
+
+
+def test_curl_failure_is_raised_after_progress(make_base, monkeypatch):
+    monkeypatch.setattr(
+        JamfUploaderBase.subprocess,
+        "Popen",
+        lambda *args, **kwargs: FakeCurl(
+            [b"##   40.0%\r", b"curl: (55) Send failure: Broken pipe\n"], returncode=55
+        ),
+    )
+    sent = []
+    with pytest.raises(subprocess.CalledProcessError) as excinfo:
+        make_base().run_curl_with_progress(["curl"], 1000, sent.append)
+    assert excinfo.value.returncode == 55
+    assert sent == [400]
+
+
+def test_progress_reader_counts_bytes_read():
+    sent = []
+    reader = ProgressReader(io.BytesIO(b"x" * 10), sent.append)
+    assert reader.read(4) == b"xxxx"
+    assert reader.read() == b"x" * 6
+    assert reader.read() == b""
+    assert sent == [4, 6]
+    assert reader.tell() == 10